@@ -0,0 +1,80 @@
+# chess_batch.py
+# Analyses many positions without any interaction. The positions are read
+# from .chb files, which hold one board each, .fen files, which hold one
+# position in Forsyth-Edwards Notation per line, and binary .pos files, see
+# chess_positions.py. A directory stands for all those files in it. The
+# positions are searched in a pool of worker
+# processes, each for at most the given time, and the result of every
+# position is written to stdout as a line of JSON as soon as it is known.
+#
+# Usage: python chess_batch.py [--time SECONDS] [--depth N] [--workers N]
+#                              [--bitboard] PATH ...
+
+from __future__ import print_function
+import argparse
+import json
+import multiprocessing
+import sys
+import time
+
+from chess_positions import load_position, read_positions
+from chessgame import (BitboardChessBoard, ChessBoard, ChessComputer,
+                       move_to_notation)
+
+
+# Searches one position in a worker process and returns its result as a
+# dictionary
+def analyse(task):
+    ((name, kind, data), board_class, depth, time_limit) = task
+    result = {"position": name}
+    try:
+        chessboard = load_position(kind, data, board_class)
+    except ValueError as error:
+        result["error"] = str(error)
+        return result
+
+    if depth == None:
+        depth = ChessComputer.max_depth
+    start_time = time.time()
+    (score, move, searched_depth) = ChessComputer.iterative_deepening(
+        chessboard, depth, time_limit)
+    result.update({
+        "move": move_to_notation(move) if move != None else None,
+        "score": score,
+        "depth": searched_depth,
+        "nodes": ChessComputer.nodes,
+        "seconds": round(time.time() - start_time, 3),
+    })
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Analyse positions in a pool of worker processes.")
+    parser.add_argument("paths", nargs="+",
+                        help=".chb, .fen or .pos files or directories")
+    parser.add_argument("--time", type=float, default=1.0,
+                        help="the seconds to search every position")
+    parser.add_argument("--depth", type=int,
+                        help="the depth to search every position to")
+    parser.add_argument("--workers", type=int,
+                        default=multiprocessing.cpu_count())
+    parser.add_argument("--bitboard", action="store_true",
+                        help="use BitboardChessBoard instead of ChessBoard")
+    args = parser.parse_args()
+
+    board_class = BitboardChessBoard if args.bitboard else ChessBoard
+    tasks = [(position, board_class, args.depth, args.time)
+             for position in read_positions(args.paths)]
+    pool = multiprocessing.Pool(args.workers)
+    try:
+        for result in pool.imap_unordered(analyse, tasks):
+            print(json.dumps(result, sort_keys=True))
+            sys.stdout.flush()
+    finally:
+        pool.close()
+        pool.join()
+
+
+if __name__ == "__main__":
+    main()
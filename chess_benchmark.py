@@ -0,0 +1,150 @@
+# chess_benchmark.py
+# Measures the speed of the search in chessgame.py. Every board is searched at
+# a fixed set of depths with both minimax and alphabeta, and for every search
+# the time, the number of nodes, the nodes per second, the best move and the
+# score are written as JSON. Every search is repeated and the fastest time
+# counts. Given the JSON of an earlier run as baseline, a search is flagged as
+# a regression when its nodes per second dropped by more than the tolerance,
+# or when it found another best move. Searches that take less time than
+# MIN_SECONDS are too short to time reliably, so only their moves are
+# compared. The boards break ties between equal moves differently, so a
+# baseline of the other board class is refused.
+#
+# Usage: python chess_benchmark.py [--output FILE] [--baseline FILE]
+#                                  [--bitboard] [board.chb ...]
+
+from __future__ import print_function
+import argparse
+import glob
+import json
+import os
+import platform
+import sys
+import time
+
+from chessgame import (BitboardChessBoard, ChessBoard, ChessComputer,
+                       load_board, move_to_notation)
+
+
+MIN_SECONDS = 0.01
+
+
+# Searches every board at every depth with the given algorithm, and returns a
+# list with a result dictionary for every search
+def run_searches(filenames, algorithm, depths, board_class, repeat):
+    results = []
+    for filename in filenames:
+        for depth in depths:
+            chessboard = load_board(filename, board_class)
+            seconds = None
+            for _ in range(repeat):
+                ChessComputer.transposition_table.clear()
+                start_time = time.time()
+                (score, move) = ChessComputer.computer_move(
+                    chessboard, depth, alphabeta=algorithm == "alphabeta")
+                elapsed = time.time() - start_time
+                if seconds == None or elapsed < seconds:
+                    seconds = elapsed
+            nodes = ChessComputer.nodes
+            results.append({
+                "board": os.path.basename(filename),
+                "algorithm": algorithm,
+                "depth": depth,
+                "seconds": round(seconds, 4),
+                "nodes": nodes,
+                "nodes_per_second": round(nodes / max(seconds, 1e-6)),
+                "move": move_to_notation(move) if move != None else None,
+                "score": score,
+            })
+    return results
+
+
+# Returns a list of messages for the results that are worse than the result
+# of the same search in the baseline
+def find_regressions(results, baseline, tolerance):
+    baseline_results = dict(((result["board"], result["algorithm"],
+                              result["depth"]), result)
+                            for result in baseline["results"])
+    regressions = []
+    for result in results:
+        name = "%s %s depth %d" % (result["board"], result["algorithm"],
+                                   result["depth"])
+        old = baseline_results.get((result["board"], result["algorithm"],
+                                    result["depth"]))
+        if old == None:
+            continue
+        timed = min(result["seconds"], old["seconds"]) >= MIN_SECONDS
+        if timed and result["nodes_per_second"] < \
+                old["nodes_per_second"] * (1 - tolerance):
+            regressions.append("%s: %d nodes per second, was %d" % (
+                name, result["nodes_per_second"], old["nodes_per_second"]))
+        if result["move"] != old["move"]:
+            regressions.append("%s: best move %s, was %s" % (
+                name, result["move"], old["move"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark minimax and alphabeta on a set of boards.")
+    parser.add_argument("boards", nargs="*",
+                        default=sorted(glob.glob("board_configurations/*.chb")))
+    parser.add_argument("--minimax-depths", type=int, nargs="+",
+                        default=[1, 2, 3])
+    parser.add_argument("--alphabeta-depths", type=int, nargs="+",
+                        default=[1, 2, 3, 4, 5])
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="the number of times every search is timed")
+    parser.add_argument("--bitboard", action="store_true",
+                        help="use BitboardChessBoard instead of ChessBoard")
+    parser.add_argument("--output", help="write the JSON to this file")
+    parser.add_argument("--baseline", help="JSON of an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="the fraction nodes per second may drop")
+    args = parser.parse_args()
+
+    board_class = BitboardChessBoard if args.bitboard else ChessBoard
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("board_class") != board_class.__name__:
+            sys.exit("The baseline was run with %s, not with %s" % (
+                baseline.get("board_class"), board_class.__name__))
+
+    results = run_searches(args.boards, "minimax", args.minimax_depths,
+                           board_class, args.repeat)
+    results += run_searches(args.boards, "alphabeta", args.alphabeta_depths,
+                            board_class, args.repeat)
+    report = {
+        "python": platform.python_version(),
+        "board_class": board_class.__name__,
+        "results": results,
+    }
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    for algorithm in ["minimax", "alphabeta"]:
+        searches = [result for result in results
+                    if result["algorithm"] == algorithm]
+        seconds = sum(result["seconds"] for result in searches)
+        nodes = sum(result["nodes"] for result in searches)
+        print("%-9s %8d nodes %8.2f s %9d nodes/s" % (
+            algorithm, nodes, seconds, nodes / max(seconds, 1e-6)),
+            file=sys.stderr)
+
+    if baseline != None:
+        regressions = find_regressions(results, baseline, args.tolerance)
+        for regression in regressions:
+            print("Regression: " + regression, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+# chess_cache.py
+# A position cache that is kept on disk between runs of chessgame.py. For
+# every position it stores the best move found, its score and the depth of the
+# search, keyed by the Zobrist hash of the position. The file is memory-mapped
+# and has a fixed size, so once it is full old results are evicted.
+#
+# Several processes may use the same file: readers take a shared lock and
+# writers an exclusive one. Where fcntl is not available (Windows) the file is
+# not locked.
+
+import mmap
+import os
+import struct
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+# The file starts with a header of a magic string and the number of records.
+# Every record holds the hash key, the score, the move, the depth and the
+# time it was stored. A key of 0 marks an empty record.
+MAGIC = b'CHESSPC1'
+HEADER = struct.Struct('<8sQ')
+RECORD = struct.Struct('<QiHHI')
+# A position can only be stored in the records of the bucket its key belongs
+# to
+BUCKET_SIZE = 4
+
+
+class PositionCache:
+
+    # Opens the cache in filename, and creates it with a size of megabytes
+    # when it does not exist yet. An existing file keeps its own size.
+    def __init__(self, filename, megabytes=16):
+        self.filename = filename
+        if not os.path.exists(filename):
+            records = (megabytes * 1024 * 1024 - HEADER.size) // RECORD.size
+            records -= records % BUCKET_SIZE
+            with open(filename, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, records))
+                f.truncate(HEADER.size + records * RECORD.size)
+
+        self.file = open(filename, 'r+b')
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        (magic, self.records) = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or \
+                len(self.map) != HEADER.size + self.records * RECORD.size:
+            self.close()
+            raise ValueError(filename + " is not a position cache")
+        self.buckets = self.records // BUCKET_SIZE
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # Returns a tuple of the move, score and depth stored for the given key,
+    # or None when the position is not in the cache
+    def lookup(self, key):
+        self.lock(False)
+        try:
+            for offset in self.bucket_offsets(key):
+                (record_key, score, move, depth, _) = \
+                    RECORD.unpack_from(self.map, offset)
+                if record_key == key:
+                    return move, score, depth
+            return None
+        finally:
+            self.unlock()
+
+    # Stores the result of a search of the given key. A result of a search
+    # less deep than the one already stored is ignored. When the bucket of
+    # the key is full, the least deep result in it is evicted, and the oldest
+    # one among those of equal depth.
+    def store(self, key, move, score, depth):
+        self.lock(True)
+        try:
+            victim = None
+            victim_rank = None
+            for offset in self.bucket_offsets(key):
+                (record_key, _, _, record_depth, stamp) = \
+                    RECORD.unpack_from(self.map, offset)
+                if record_key == key:
+                    if record_depth > depth:
+                        return
+                    victim = offset
+                    break
+                rank = (record_depth, stamp) if record_key else (-1, 0)
+                if victim == None or rank < victim_rank:
+                    (victim, victim_rank) = (offset, rank)
+
+            RECORD.pack_into(self.map, victim, key, score, move, depth,
+                             int(time.time()))
+        finally:
+            self.unlock()
+
+    # Removes all results from the cache
+    def clear(self):
+        self.lock(True)
+        try:
+            empty = RECORD.pack(0, 0, 0, 0, 0)
+            for index in range(self.records):
+                offset = HEADER.size + index * RECORD.size
+                self.map[offset:offset + RECORD.size] = empty
+        finally:
+            self.unlock()
+
+    # Writes the changes made so far to the file
+    def flush(self):
+        self.map.flush()
+
+    # Returns the number of results in the cache
+    def __len__(self):
+        count = 0
+        for index in range(self.records):
+            if RECORD.unpack_from(self.map, HEADER.size + index * RECORD.size)[0]:
+                count += 1
+        return count
+
+    def bucket_offsets(self, key):
+        first = HEADER.size + (key % self.buckets) * BUCKET_SIZE * RECORD.size
+        return range(first, first + BUCKET_SIZE * RECORD.size, RECORD.size)
+
+    def lock(self, exclusive):
+        if fcntl != None:
+            fcntl.flock(self.file.fileno(),
+                        fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+    def unlock(self):
+        if fcntl != None:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,71 @@
+# chess_cache_check.py
+# Checks that a PositionCache from chess_cache.py saves work. Every board is
+# searched to the given depth without a cache, and again with a cache that
+# holds the result of a search one ply less deep. The search with the cache
+# starts at the iteration of the given depth, so it should visit fewer nodes
+# and find the same score.
+#
+# Usage: python chess_cache_check.py [--depth N] [--workers N] [board.chb ...]
+
+from __future__ import print_function
+import argparse
+import glob
+import os
+import sys
+import tempfile
+
+from chess_cache import PositionCache
+from chessgame import ChessComputer, load_board
+
+
+# Searches the board and returns the score and the number of nodes
+def search(filename, depth, workers, cache):
+    chessboard = load_board(filename)
+    ChessComputer.transposition_table.clear()
+    (score, _) = ChessComputer.computer_move(chessboard, depth,
+                                             alphabeta=True, workers=workers,
+                                             cache=cache)
+    return score, ChessComputer.nodes
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check that the position cache saves nodes.")
+    parser.add_argument("boards", nargs="*",
+                        default=sorted(glob.glob("board_configurations/*.chb")))
+    parser.add_argument("--depth", type=int, default=6)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+    if args.depth < 2:
+        parser.error("the depth must be at least 2")
+
+    (handle, path) = tempfile.mkstemp(suffix=".cache")
+    os.close(handle)
+    os.remove(path)
+    print("%-40s %10s %14s" % ("board", "cold nodes", "cached nodes"))
+    saved = True
+    try:
+        with PositionCache(path) as cache:
+            for filename in args.boards:
+                (score, nodes) = search(filename, args.depth, args.workers,
+                                        None)
+                search(filename, args.depth - 1, args.workers, cache)
+                (cached_score, cached_nodes) = search(
+                    filename, args.depth, args.workers, cache)
+                print("%-40s %10d %14d" % (filename, nodes, cached_nodes))
+                if cached_score != score:
+                    print("The score with the cache is %d, not %d" % (
+                        cached_score, score))
+                    saved = False
+                elif cached_nodes >= nodes:
+                    saved = False
+    finally:
+        os.remove(path)
+
+    if not saved:
+        print("The cache did not save nodes on every board")
+    sys.exit(0 if saved else 1)
+
+
+if __name__ == "__main__":
+    main()
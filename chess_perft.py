@@ -0,0 +1,188 @@
+# chess_perft.py
+# Counts the positions the move generator of chessgame.py reaches, without
+# any search or evaluation, so its speed and correctness can be measured on
+# their own. perft N is the number of move sequences of N moves from a
+# position. A position in which the side to move has lost its king ends the
+# game, so no moves are made from it.
+#
+# With --divide the count is broken down per move from the position, which
+# helps to find the move for which two move generators disagree. The counts
+# of the boards in this repository are checked against KNOWN_COUNTS.
+#
+# With --legality N, is_legal_move() is checked against legal_moves() for
+# every pair of squares in N random positions instead.
+#
+# Usage: python chess_perft.py [--divide] [--bitboard] DEPTH [POSITION ...]
+#        python chess_perft.py [--bitboard] --legality N [--seed SEED]
+# A POSITION is a .chb file, a .fen file or a FEN string.
+
+from __future__ import print_function
+import argparse
+import glob
+import os
+import random
+import sys
+import time
+
+from chessgame import (BitboardChessBoard, CAPTURE, ChessBoard, MATERIALS,
+                       Material, PIECE_CODES, Side, encode_move, load_board,
+                       move_to_notation)
+
+
+# perft 1, 2, 3, 4 and 5 of the boards in this repository, as counted by the
+# original move generator that made a copy of the board for every move
+KNOWN_COUNTS = {
+    "board.chb": [17, 80, 1427, 8091, 144701],
+    "capture_king1.chb": [10, 72, 531, 4080, 31305],
+    "capture_king2.chb": [17, 80, 1427, 8091, 144701],
+    "capture_rook1.chb": [8, 168, 1446, 29557, 260239],
+    "good_exchange1.chb": [19, 618, 11305, 338305, 6114342],
+    "mate_in_one1.chb": [22, 110, 2153, 11646, 216375],
+    "mate_in_one2.chb": [22, 169, 3390, 27785, 524958],
+    "mate_in_two1.chb": [33, 165, 5209, 35278, 1087824],
+}
+
+
+# Returns the number of move sequences of depth moves from the position on
+# the board
+def perft(chessboard, depth):
+    if depth == 0:
+        return 1
+    if chessboard.is_king_dead(chessboard.turn):
+        return 0
+
+    moves = chessboard.legal_moves()
+    if depth == 1:
+        return len(moves)
+    count = 0
+    for move in moves:
+        chessboard.push(move)
+        count += perft(chessboard, depth - 1)
+        chessboard.pop()
+    return count
+
+
+# Returns a list of (move, count) tuples with the perft of depth - 1 after
+# every move from the position on the board
+def divide(chessboard, depth):
+    counts = []
+    for move in chessboard.legal_moves():
+        chessboard.push(move)
+        counts.append((move, perft(chessboard, depth - 1)))
+        chessboard.pop()
+    return counts
+
+
+# Returns a board with both kings and up to 16 other pieces on random squares
+def random_position(board_class, generator):
+    codes = [0] * 64
+    squares = generator.sample(range(64), 2 + generator.randint(0, 16))
+    codes[squares[0]] = PIECE_CODES[Side.White][Material.King]
+    codes[squares[1]] = PIECE_CODES[Side.Black][Material.King]
+    others = [PIECE_CODES[side][material] for side in [Side.White, Side.Black]
+              for material in MATERIALS if material != Material.King]
+    for square in squares[2:]:
+        codes[square] = generator.choice(others)
+    chessboard = board_class(generator.choice([Side.White, Side.Black]))
+    chessboard.load_from_array(codes)
+    return chessboard
+
+
+# Checks is_legal_move() against legal_moves() for all 4096 pairs of squares
+# in count random positions, and returns the list of (board, move) tuples on
+# which they disagree
+def check_legality(board_class, count, seed):
+    generator = random.Random(seed)
+    mistakes = []
+    for _ in range(count):
+        chessboard = random_position(board_class, generator)
+        legal = set(chessboard.legal_moves())
+        for start in range(64):
+            for end in range(64):
+                move = encode_move(start, end)
+                expected = move in legal or move | CAPTURE in legal
+                if chessboard.is_legal_move(move) != expected:
+                    mistakes.append((chessboard, move))
+    return mistakes
+
+
+def load_position(position, board_class):
+    if os.path.isfile(position):
+        return load_board(position, board_class)
+    chessboard = board_class(0)
+    chessboard.load_from_fen(position)
+    return chessboard
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Count the positions the move generator reaches.")
+    parser.add_argument("depth", type=int, nargs="?")
+    parser.add_argument("positions", nargs="*",
+                        default=["board.chb"] +
+                        sorted(glob.glob("board_configurations/*.chb")))
+    parser.add_argument("--divide", action="store_true",
+                        help="show the count after every first move")
+    parser.add_argument("--bitboard", action="store_true",
+                        help="use BitboardChessBoard instead of ChessBoard")
+    parser.add_argument("--legality", type=int, metavar="N",
+                        help="check is_legal_move() in N random positions")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="the seed of the random positions")
+    args = parser.parse_args()
+
+    board_class = BitboardChessBoard if args.bitboard else ChessBoard
+    if args.legality != None:
+        start_time = time.time()
+        mistakes = check_legality(board_class, args.legality, args.seed)
+        for (chessboard, move) in mistakes[:10]:
+            print("%s %s: is_legal_move() disagrees with legal_moves()" % (
+                chessboard.to_fen(), move_to_notation(move)))
+        print("%d positions, %d moves, %d mistakes, %.2fs" % (
+            args.legality, args.legality * 4096, len(mistakes),
+            time.time() - start_time))
+        sys.exit(1 if mistakes else 0)
+    if args.depth == None:
+        parser.error("the DEPTH is required")
+    if args.depth < 1:
+        parser.error("the DEPTH must be at least 1")
+
+    all_known = True
+    total_count = 0
+    total_time = 0
+    for position in args.positions:
+        chessboard = load_position(position, board_class)
+        start_time = time.time()
+        if args.divide:
+            counts = divide(chessboard, args.depth)
+            count = sum(move_count for (_, move_count) in counts)
+        else:
+            count = perft(chessboard, args.depth)
+        seconds = time.time() - start_time
+        total_count += count
+        total_time += seconds
+
+        if args.divide:
+            print(position)
+            for (move, move_count) in sorted(
+                    counts, key=lambda count: move_to_notation(count[0])):
+                print("  %s %d" % (move_to_notation(move), move_count))
+
+        known = KNOWN_COUNTS.get(os.path.basename(position), [])
+        check = ""
+        if args.depth <= len(known):
+            if count == known[args.depth - 1]:
+                check = "ok"
+            else:
+                check = "expected %d" % known[args.depth - 1]
+                all_known = False
+        print("%-40s %10d %8.2fs %10d/s %s" % (
+            position, count, seconds, count / max(seconds, 1e-6), check))
+
+    print("%-40s %10d %8.2fs %10d/s" % (
+        "total", total_count, total_time, total_count / max(total_time, 1e-6)))
+    sys.exit(0 if all_known else 1)
+
+
+if __name__ == "__main__":
+    main()
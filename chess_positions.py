@@ -0,0 +1,145 @@
+# chess_positions.py
+# Stores large sets of positions in the binary format of chessgame.py, see
+# ChessBoard.to_bytes(). A .pos file is nothing but positions of
+# POSITION_SIZE bytes one after the other, so it is read by memory-mapping it
+# and any position can be loaded without parsing text.
+#
+# Usage: python chess_positions.py OUTPUT.pos PATH ...
+# writes the positions in the .chb files, .fen files (one position per line),
+# .pos files and directories of those to OUTPUT.pos, and
+#        python chess_positions.py --dump FILE.pos
+# prints the positions in a .pos file as FEN.
+
+from __future__ import print_function
+import argparse
+import glob
+import mmap
+import os
+import sys
+
+from chessgame import ChessBoard, POSITION_SIZE, Side
+
+
+# A .pos file opened for reading. Its positions are numbered from 0.
+class PositionFile:
+
+    def __init__(self, filename):
+        self.file = open(filename, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        if size % POSITION_SIZE:
+            self.file.close()
+            raise ValueError(filename + " is not a position file")
+        self.map = None
+        if size:
+            self.map = mmap.mmap(self.file.fileno(), 0,
+                                 access=mmap.ACCESS_READ)
+        self.count = size // POSITION_SIZE
+
+    def close(self):
+        if self.map != None:
+            self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    # Returns the binary position with the given number
+    def __getitem__(self, index):
+        if not 0 <= index < self.count:
+            raise IndexError("position index out of range")
+        return self.map[index * POSITION_SIZE:(index + 1) * POSITION_SIZE]
+
+    # Returns a new board with the position with the given number
+    def load(self, index, board_class=ChessBoard):
+        chessboard = board_class(Side.White)
+        chessboard.load_from_bytes(self[index])
+        return chessboard
+
+
+# Writes the given boards to a .pos file
+def write_positions(filename, chessboards):
+    with open(filename, 'wb') as f:
+        for chessboard in chessboards:
+            f.write(chessboard.to_bytes())
+
+
+# Returns a list of (name, kind, data) tuples for the positions in the given
+# files and directories. kind is the extension of the file, "chb", "fen" or
+# "pos", and data the text or bytes of the position, see load_position(). A
+# directory stands for all those files in it.
+def read_positions(paths):
+    filenames = []
+    for path in paths:
+        if os.path.isdir(path):
+            filenames += sorted(glob.glob(os.path.join(path, "*.chb")) +
+                                glob.glob(os.path.join(path, "*.fen")) +
+                                glob.glob(os.path.join(path, "*.pos")))
+        else:
+            filenames.append(path)
+
+    positions = []
+    for filename in filenames:
+        if filename.endswith(".pos"):
+            with PositionFile(filename) as position_file:
+                for index in range(len(position_file)):
+                    positions.append(("%s:%d" % (filename, index), "pos",
+                                      position_file[index]))
+            continue
+        with open(filename) as f:
+            if not filename.endswith(".fen"):
+                positions.append((filename, "chb", f.read()))
+                continue
+            for number, line in enumerate(f):
+                if line.strip():
+                    positions.append(("%s:%d" % (filename, number + 1), "fen",
+                                      line.strip()))
+    return positions
+
+
+# Returns a new board with a position returned by read_positions(). Raises a
+# ValueError when the position is not valid.
+def load_position(kind, data, board_class=ChessBoard):
+    chessboard = board_class(Side.White)
+    if kind == "fen":
+        chessboard.load_from_fen(data)
+    elif kind == "pos":
+        chessboard.load_from_bytes(data)
+    else:
+        chessboard.load_from_input(data)
+    return chessboard
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write positions to a binary .pos file, or dump one.")
+    parser.add_argument("output", help="the .pos file")
+    parser.add_argument("paths", nargs="*",
+                        help=".chb, .fen or .pos files or directories")
+    parser.add_argument("--dump", action="store_true",
+                        help="print the positions in the .pos file as FEN")
+    args = parser.parse_args()
+
+    if args.dump:
+        with PositionFile(args.output) as positions:
+            for index in range(len(positions)):
+                print(positions.load(index).to_fen())
+        return
+
+    chessboards = []
+    for (name, kind, data) in read_positions(args.paths):
+        try:
+            chessboards.append(load_position(kind, data))
+        except ValueError as error:
+            print("Skipped %s: %s" % (name, error), file=sys.stderr)
+    write_positions(args.output, chessboards)
+    print("Wrote %d positions to %s" % (len(chessboards), args.output))
+
+
+if __name__ == "__main__":
+    main()
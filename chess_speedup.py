@@ -0,0 +1,79 @@
+# chess_speedup.py
+# Reports how the parallel search of chessgame.py scales with the number of
+# worker processes. Every board is searched to the same depth, once with the
+# normal search and once for every number of workers, and the total times are
+# compared. It also checks that every parallel search finds the same score as
+# the normal search.
+#
+# Usage: python chess_speedup.py [--depth N] [--workers N] [board.chb ...]
+
+from __future__ import print_function
+import argparse
+import glob
+import multiprocessing
+import sys
+import time
+
+from chessgame import ChessComputer, load_board
+
+
+# Searches every board and returns the total time in seconds, the total number
+# of nodes and the list of scores
+def search_all(filenames, depth, workers):
+    total_time = 0
+    total_nodes = 0
+    scores = []
+    for filename in filenames:
+        chessboard = load_board(filename)
+        ChessComputer.transposition_table.clear()
+        start_time = time.time()
+        (score, _) = ChessComputer.computer_move(chessboard, depth,
+                                                 alphabeta=True,
+                                                 workers=workers)
+        total_time += time.time() - start_time
+        total_nodes += ChessComputer.nodes
+        scores.append(score)
+    return total_time, total_nodes, scores
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the speedup of the parallel search.")
+    parser.add_argument("boards", nargs="*",
+                        default=sorted(glob.glob("board_configurations/*.chb")))
+    parser.add_argument("--depth", type=int, default=5)
+    parser.add_argument("--workers", type=int,
+                        default=multiprocessing.cpu_count())
+    args = parser.parse_args()
+
+    worker_counts = [1]
+    while worker_counts[-1] * 2 < args.workers:
+        worker_counts.append(worker_counts[-1] * 2)
+    if args.workers > 1:
+        worker_counts.append(args.workers)
+
+    (serial_time, serial_nodes, serial_scores) = search_all(args.boards,
+                                                            args.depth, 1)
+    print("%d boards at depth %d" % (len(args.boards), args.depth))
+    print("workers   seconds   speedup   efficiency   nodes")
+    print("%7s %9.2f %9.2f %12.2f %7d" % ("serial", serial_time, 1, 1,
+                                         serial_nodes))
+
+    same_scores = True
+    for workers in worker_counts:
+        if workers == 1:
+            continue
+        (total_time, nodes, scores) = search_all(args.boards, args.depth,
+                                                 workers)
+        speedup = serial_time / total_time
+        print("%7d %9.2f %9.2f %12.2f %7d" % (workers, total_time, speedup,
+                                             speedup / workers, nodes))
+        if scores != serial_scores:
+            print("Scores differ from the serial search: " + str(scores))
+            same_scores = False
+
+    sys.exit(0 if same_scores else 1)
+
+
+if __name__ == "__main__":
+    main()
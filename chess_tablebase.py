@@ -0,0 +1,232 @@
+# chess_tablebase.py
+# Builds the endgame tablebases of chessgame.py by retrograde analysis, see
+# Tablebases in chessgame.py. A tablebase is named after its materials, white
+# first, e.g. KRK for a white king and rook against a black king, and is
+# written to NAME.tbl in the tablebase directory. The tablebases of the
+# materials that remain after a capture are built first.
+#
+# The moves are those of ChessBoard.legal_moves(), so the tables follow the
+# rules of this game: there is no check, a side wins by capturing the enemy
+# king, and pawns never promote. Every position is kept in memory while a
+# table is built, so tables of more than three pieces take very long.
+#
+# Usage: python chess_tablebase.py [--directory DIR] [NAME ...]
+
+from __future__ import print_function
+import argparse
+import array
+import os
+import time
+
+from chessgame import (ChessBoard, MATERIAL_WORTHS, PIECE_CODES, Side,
+                       TABLEBASE_MATERIALS, Tablebases, tablebase_squares)
+
+
+DEFAULT_NAMES = ["KQK", "KRK", "KBK", "KNK", "KPK"]
+# The longest distance to mate a signed byte can hold
+MAX_DISTANCE = 127
+
+
+# Returns the name with the pieces of every side in the order of
+# TABLEBASE_MATERIALS, and the list of the (side, material) of its pieces.
+# Raises a ValueError when the name does not give both sides one king.
+def parse_name(name):
+    letters = name.upper()
+    if letters.count("K") != 2 or not letters.startswith("K") or \
+            any(letter.lower() not in TABLEBASE_MATERIALS
+                for letter in letters):
+        raise ValueError("No such tablebase: " + name)
+    black = letters.index("K", 1)
+    pieces = []
+    for (side, part) in [(Side.White, letters[:black]),
+                         (Side.Black, letters[black:])]:
+        materials = sorted((letter.lower() for letter in part),
+                           key=TABLEBASE_MATERIALS.index)
+        pieces += [(side, material) for material in materials]
+    name = "".join(material.upper() for (_, material) in pieces)
+    return name, pieces
+
+
+# Returns the names of the tablebases a capture in the given one leads to.
+# Tablebases.probe() also finds a table with the colors swapped, so only the
+# one in which white has the most material is needed.
+def smaller_names(name):
+    (name, pieces) = parse_name(name)
+    names = set()
+    for index, (_, material) in enumerate(pieces):
+        if material == TABLEBASE_MATERIALS[0]:
+            continue
+        remaining = pieces[:index] + pieces[index + 1:]
+        worth = sum(MATERIAL_WORTHS[piece_material] *
+                    (1 if side == Side.White else -1)
+                    for (side, piece_material) in remaining)
+        codes = [0] * 64
+        for square, (side, piece_material) in enumerate(remaining):
+            if worth < 0:
+                side = 1 - side
+            codes[square] = PIECE_CODES[side][piece_material]
+        names.add(tablebase_squares(codes)[0])
+    return sorted(names)
+
+
+# Returns the table of the given name as an array of signed bytes. A capture
+# leads to a position in one of the tablebases, which must hold the smaller
+# tables.
+#
+# First every move of every position is generated once. A move that stays in
+# this table becomes an edge from the position after it back to the position
+# before it. A move that captures a king or leads to another table gives a
+# known result at once. Then the results are spread backwards, one ply at a
+# time: a position is won in n + 1 plies when a move leads to a position lost
+# in n, and lost in n + 1 when every move leads to a position won in at most
+# n. What is never reached is a draw.
+def build_table(name, tablebases):
+    (name, pieces) = parse_name(name)
+    count = len(pieces)
+    size = 2 * 64 ** count
+    piece_codes = [PIECE_CODES[side][material] for (side, material) in pieces]
+    boards = [ChessBoard(Side.White), ChessBoard(Side.Black)]
+
+    # The moves of every position that are not known yet, the edges and the
+    # known results of every distance as (position, whether the position
+    # after the move is lost) tuples
+    remaining = array.array('H', [0]) * size
+    edge_ends = array.array('i')
+    edge_starts = array.array('i')
+    known = [[] for _ in range(MAX_DISTANCE + 1)]
+
+    codes = [0] * 64
+    for placement in range(64 ** count):
+        squares = []
+        rest = placement
+        for _ in range(count):
+            squares.append(rest & 63)
+            rest >>= 6
+        squares.reverse()
+        if len(set(squares)) < count:
+            continue
+        for square, code in zip(squares, piece_codes):
+            codes[square] = code
+
+        for chessboard in boards:
+            turn = chessboard.turn
+            index = placement * 2 + turn
+            chessboard.load_from_array(codes)
+            moves = chessboard.legal_moves()
+            remaining[index] = len(moves)
+            for move in moves:
+                start = move & 63
+                end = move >> 6 & 63
+                if end not in squares:
+                    moved = count - 1 - squares.index(start)
+                    edge_ends.append(index + (1 - 2 * turn) +
+                                     ((end - start) << 6 * moved + 1))
+                    edge_starts.append(index)
+                    continue
+
+                victim = chessboard.get_boardpiece((end & 7, end >> 3))
+                if victim.material == TABLEBASE_MATERIALS[0]:
+                    # The position after the move is lost when the enemy
+                    # king was taken, and won when a pawn took its own king
+                    known[0].append((index, victim.side != turn))
+                    continue
+                chessboard.push(move)
+                distance = tablebases.probe(chessboard)
+                if distance == None:
+                    raise ValueError("There is no tablebase for " +
+                                     chessboard.to_fen())
+                chessboard.pop()
+                if distance:
+                    known[abs(distance)].append((index, distance < 0))
+
+        for square in squares:
+            codes[square] = 0
+
+    # The edges that end in every position, sorted by their end
+    offsets = array.array('i', [0]) * (size + 1)
+    for end in edge_ends:
+        offsets[end + 1] += 1
+    for index in range(size):
+        offsets[index + 1] += offsets[index]
+    starts = array.array('i', [0]) * len(edge_starts)
+    filled = offsets[:]
+    for (end, start) in zip(edge_ends, edge_starts):
+        starts[filled[end]] = start
+        filled[end] += 1
+    del edge_ends, edge_starts, filled
+
+    table = array.array('b', [0]) * size
+    for distance in range(MAX_DISTANCE):
+        found = []
+        for (index, lost) in known[distance]:
+            if table[index]:
+                continue
+            if lost:
+                table[index] = distance + 1
+                found.append(index)
+            else:
+                remaining[index] -= 1
+                if not remaining[index]:
+                    table[index] = -distance - 1
+                    found.append(index)
+        for end in found:
+            lost = table[end] < 0
+            known[distance + 1].extend(
+                (start, lost)
+                for start in starts[offsets[end]:offsets[end + 1]])
+    if any(not table[index] for (index, _) in known[MAX_DISTANCE]):
+        raise ValueError("The distances in %s do not fit in a byte" % name)
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build endgame tablebases by retrograde analysis.")
+    parser.add_argument("names", nargs="*", default=DEFAULT_NAMES,
+                        help="the materials, e.g. KRK")
+    parser.add_argument("--directory", default="tablebases",
+                        help="the directory of the .tbl files")
+    args = parser.parse_args()
+
+    try:
+        pending = [parse_name(name)[0] for name in reversed(args.names)]
+    except ValueError as error:
+        parser.error(str(error))
+    if not os.path.isdir(args.directory):
+        os.makedirs(args.directory)
+    tablebases = Tablebases(args.directory)
+
+    # The smaller tables come first
+    names = []
+    while pending:
+        name = pending.pop()
+        if name in names:
+            continue
+        missing = [smaller for smaller in smaller_names(name)
+                   if smaller not in names and
+                   smaller not in tablebases.tables]
+        if missing:
+            pending += [name] + missing
+        else:
+            names.append(name)
+
+    for name in names:
+        if name in tablebases.tables:
+            print("%s exists" % name)
+            continue
+        start_time = time.time()
+        table = build_table(name, tablebases)
+        with open(os.path.join(args.directory, name + ".tbl"), 'wb') as f:
+            table.tofile(f)
+        tablebases.close()
+        tablebases = Tablebases(args.directory)
+        wins = sum(1 for distance in table if distance > 0)
+        losses = sum(1 for distance in table if distance < 0)
+        print("%s: %d won, %d lost, longest %d plies, %.1fs" % (
+            name, wins, losses, max(abs(distance) for distance in table),
+            time.time() - start_time))
+    tablebases.close()
+
+
+if __name__ == "__main__":
+    main()
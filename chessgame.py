@@ -6,7 +6,25 @@
 # By Jochem (11007729) and Reitze (11045442) on 8 june 2017 from group C
 
 from __future__ import print_function
+import array
+import glob
+import mmap
+import multiprocessing
+import os
+import random
+import struct
 import sys
+import threading
+import time
+
+from chess_cache import PositionCache
+
+# NumPy is only needed to evaluate many positions at once, see
+# ChessComputer.evaluate_children()
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 # Helper functions
 
@@ -34,6 +52,54 @@ def to_move(from_coord, to_coord):
     return to_notation(from_coord) + to_notation(to_coord)
 
 
+# Squares are numbered 0 to 63 row by row, starting at a8 (x=0, y=0) and ending
+# at h1 (x=7, y=7), so the square of (x, y) is y * 8 + x.
+def to_square(coordinates):
+    (x, y) = coordinates
+    return y * 8 + x
+
+
+# Translate a square number back to x,y-coordinates
+def to_position(square):
+    return square % 8, square // 8
+
+
+# The chess notation of every square, so moves can be built by concatenation
+SQUARE_NOTATIONS = [to_notation(to_position(square)) for square in range(64)]
+
+# Inside the program a move is an integer, with the start square in the
+# lowest 6 bits, the end square in the next 6 bits and flags above those.
+# The squares are read as move & 63 and move >> 6 & 63 where they are needed,
+# as a function call costs too much in the search.
+# Chess notation is only used when talking to the user.
+
+# Flag of a move that captures a piece of the other side
+CAPTURE = 1 << 12
+
+
+# Returns the integer of a move between two squares
+# Example: 33 and 26 (b4 and c5) will become 33 + 26 * 64 = 1697
+def encode_move(start, end, flags=0):
+    return start | end << 6 | flags
+
+
+# Translate a move integer into chess notation
+# Example: 1697 will become b4c5
+def move_to_notation(move):
+    return SQUARE_NOTATIONS[move & 63] + SQUARE_NOTATIONS[move >> 6 & 63]
+
+
+# Translate a move in chess notation into an integer without flags, or None
+# when the notation is not a move
+# Example: b4c5 will become 1697
+def notation_to_move(notation):
+    if len(notation) != 4 or notation[0:2] not in SQUARE_NOTATIONS or \
+            notation[2:4] not in SQUARE_NOTATIONS:
+        return None
+    return encode_move(SQUARE_NOTATIONS.index(notation[0:2]),
+                       SQUARE_NOTATIONS.index(notation[2:4]))
+
+
 # Defining board states
 
 # These Static classes are used as enums for:
@@ -50,24 +116,289 @@ class Side:
     White, Black = range(0, 2)
 
 
+# The worth of every material
+MATERIAL_WORTHS = {Material.Bisshop: 3, Material.Knight: 3, Material.Pawn: 1,
+                   Material.Queen: 9, Material.Rook: 5, Material.King: 100}
+
+
 # A chesspiece on the board is specified by the side it belongs to and the type
-# of the chesspiece
-class Piece:
-    def __init__(self, side, material):
-        self.side = side
-        self.material = material
-        if self.material == 'b':
-            self.worth = 3
-        elif self.material == 'n':
-            self.worth = 3
-        elif self.material == 'p':
-            self.worth = 1
-        elif self.material == 'q':
-            self.worth = 9
-        elif self.material == 'r':
-            self.worth = 5
-        elif self.material == 'k':
-            self.worth = 100
+# of the chesspiece.
+# There is only one piece for every side and material, which all boards
+# share: Piece(side, material) returns that piece, and it cannot be changed.
+class Piece(object):
+    __slots__ = ['side', 'material', 'worth', 'score']
+
+    # The pieces created so far, by (side, material)
+    instances = {}
+
+    def __new__(cls, side, material):
+        piece = cls.instances.get((side, material))
+        if piece != None:
+            return piece
+        if side not in (Side.White, Side.Black) or \
+                material not in MATERIAL_WORTHS:
+            raise ValueError("No such piece: %r %r" % (side, material))
+
+        piece = object.__new__(cls)
+        worth = MATERIAL_WORTHS[material]
+        object.__setattr__(piece, 'side', side)
+        object.__setattr__(piece, 'material', material)
+        object.__setattr__(piece, 'worth', worth)
+        # The worth as it counts in the score, in which white is positive
+        object.__setattr__(piece, 'score',
+                           worth if side == Side.White else -worth)
+        cls.instances[(side, material)] = piece
+        return piece
+
+    def __setattr__(self, name, value):
+        raise AttributeError("a Piece cannot be changed")
+
+    def __delattr__(self, name):
+        raise AttributeError("a Piece cannot be changed")
+
+    # Unpickling, e.g. in the workers of a parallel search, also returns the
+    # shared piece
+    def __reduce__(self):
+        return Piece, (self.side, self.material)
+
+    def __repr__(self):
+        return "Piece(%d, %r)" % (self.side, self.material)
+
+
+# A fixed order of the materials, used to number them
+MATERIALS = [Material.Bisshop, Material.Knight, Material.Pawn, Material.Queen,
+             Material.Rook, Material.King]
+# The pieces of every side by material
+PIECES = [dict((material, Piece(side, material)) for material in MATERIALS)
+          for side in [Side.White, Side.Black]]
+
+
+# Move tables
+# The squares a piece can reach from every square are computed once, so move
+# generation only has to walk these lists and look at the board.
+
+KING_DIRECTIONS = [(dx, dy) for dx in [-1, 0, 1] for dy in [-1, 0, 1]
+                   if dx or dy]
+KNIGHT_JUMPS = [(dx, dy) for dx in [-2, -1, 1, 2] for dy in [-2, -1, 1, 2]
+                if abs(dx) != abs(dy)]
+ROOK_DIRECTIONS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+BISSHOP_DIRECTIONS = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+
+
+# Returns the squares one step of (dx, dy) away from square for every step in
+# steps that stays on the board. With slide=True every step is repeated until
+# the board edge is reached.
+def step_targets(square, steps, slide=False):
+    targets = []
+    (x, y) = to_position(square)
+    for (dx, dy) in steps:
+        (newx, newy) = (x + dx, y + dy)
+        while -1 < newx < 8 and -1 < newy < 8:
+            targets.append(to_square((newx, newy)))
+            if not slide:
+                break
+            newx += dx
+            newy += dy
+    return targets
+
+
+# Returns for every target of step_targets() a tuple of its row, its column
+# and the move to it from square, which is what the generator needs
+def target_table(square, steps, slide=False):
+    return [(target >> 3, target & 7, encode_move(square, target))
+            for target in step_targets(square, steps, slide)]
+
+
+KING_TARGETS = [target_table(square, KING_DIRECTIONS) for square in range(64)]
+KNIGHT_TARGETS = [target_table(square, KNIGHT_JUMPS) for square in range(64)]
+# For every square one ray per direction, in the order of the directions.
+# The queen uses the king directions.
+ROOK_RAYS = [[target_table(square, [direction], slide=True)
+              for direction in ROOK_DIRECTIONS] for square in range(64)]
+BISSHOP_RAYS = [[target_table(square, [direction], slide=True)
+                 for direction in BISSHOP_DIRECTIONS] for square in range(64)]
+QUEEN_RAYS = [[target_table(square, [direction], slide=True)
+               for direction in KING_DIRECTIONS] for square in range(64)]
+# For every side and square the forward step of a pawn followed by its
+# diagonal steps, or nothing on the last row
+PAWN_TARGETS = [[], []]
+for (side, dy) in [(Side.White, -1), (Side.Black, 1)]:
+    for square in range(64):
+        if 0 <= square // 8 + dy <= 7:
+            PAWN_TARGETS[side].append(
+                target_table(square, [(0, dy), (-1, dy), (1, dy)]))
+        else:
+            PAWN_TARGETS[side].append([])
+# The targets of kings, knights and pawns as rays of one square each, so they
+# can be walked like the rays of the sliders, by material
+PIECE_RAYS = {
+    Material.King: [[[target] for target in targets]
+                    for targets in KING_TARGETS],
+    Material.Knight: [[[target] for target in targets]
+                      for targets in KNIGHT_TARGETS],
+    Material.Rook: ROOK_RAYS,
+    Material.Bisshop: BISSHOP_RAYS,
+    Material.Queen: QUEEN_RAYS,
+}
+PAWN_RAYS = [[[[target] for target in targets] for targets in side_targets]
+             for side_targets in PAWN_TARGETS]
+# For every square a dictionary from every square on the same row, column or
+# diagonal to the squares between the two, which a slider needs to be empty
+BETWEEN_SQUARES = [{} for square in range(64)]
+for square in range(64):
+    for direction in KING_DIRECTIONS:
+        between = []
+        for target in step_targets(square, [direction], slide=True):
+            BETWEEN_SQUARES[square][target] = between
+            between = between + [target]
+
+
+# Zobrist hashing
+# Every combination of side, material and square gets a random 64-bit number.
+# The hash of a board is the xor of the numbers of all its pieces, xored with
+# ZOBRIST_BLACK when it is black's turn. Since xor undoes itself, a move only
+# has to xor the numbers of the squares it changes. The generator is seeded so
+# the hashes are the same in every run of the program.
+def zobrist_keys(generator):
+    return [dict((material, [generator.getrandbits(64) for _ in range(64)])
+                 for material in MATERIALS)
+            for _ in [Side.White, Side.Black]]
+
+
+zobrist_generator = random.Random(20170608)
+ZOBRIST_KEYS = zobrist_keys(zobrist_generator)
+ZOBRIST_BLACK = zobrist_generator.getrandbits(64)
+
+
+# Piece codes
+# A board can also be given as an array of 64 piece codes, see
+# ChessBoard.to_array(). The code of a piece is one more than the index of its
+# material in MATERIALS, negated for black, and 0 is an empty square.
+PIECE_CODES = [dict((material, (1 + index) * sign)
+                    for index, material in enumerate(MATERIALS))
+               for sign in [1, -1]]
+# For every piece code plus 6 a piece, which all boards share, and its
+# character in .chb files and FEN: uppercase for white
+CODE_PIECES = [None] * 13
+CODE_CHARS = ['.'] * 13
+for side in [Side.White, Side.Black]:
+    for material in MATERIALS:
+        CODE_PIECES[PIECE_CODES[side][material] + 6] = PIECES[side][material]
+        CODE_CHARS[PIECE_CODES[side][material] + 6] = \
+            material.upper() if side == Side.White else material
+CHAR_CODES = dict((char, code - 6) for code, char in enumerate(CODE_CHARS))
+
+# The binary format of a position is 32 bytes with the pieces, two squares in
+# every byte with the first in the high four bits, followed by a byte with the
+# side to move. A square holds 0 when empty, the piece code for a white piece
+# and 8 minus the piece code for a black piece.
+POSITION_SIZE = 33
+# For every byte the piece codes of its two squares, or None when it is not
+# valid
+BYTE_CODES = []
+for byte in range(256):
+    nibble_codes = [nibble if nibble < 8 else 8 - nibble
+                    for nibble in (byte >> 4, byte & 15)]
+    if all(-6 <= code <= 6 for code in nibble_codes) and \
+            8 not in (byte >> 4, byte & 15):
+        BYTE_CODES.append(nibble_codes)
+    else:
+        BYTE_CODES.append(None)
+
+
+# Piece-square tables
+# The bonus in centipawns of a white piece on every square, in the order of
+# the squares. A black piece gets the bonus of the mirrored square.
+PIECE_SQUARE_TABLES = {
+    Material.Pawn: [
+        0, 0, 0, 0, 0, 0, 0, 0,
+        50, 50, 50, 50, 50, 50, 50, 50,
+        10, 10, 20, 30, 30, 20, 10, 10,
+        5, 5, 10, 25, 25, 10, 5, 5,
+        0, 0, 0, 20, 20, 0, 0, 0,
+        5, -5, -10, 0, 0, -10, -5, 5,
+        5, 10, 10, -20, -20, 10, 10, 5,
+        0, 0, 0, 0, 0, 0, 0, 0],
+    Material.Knight: [
+        -50, -40, -30, -30, -30, -30, -40, -50,
+        -40, -20, 0, 0, 0, 0, -20, -40,
+        -30, 0, 10, 15, 15, 10, 0, -30,
+        -30, 5, 15, 20, 20, 15, 5, -30,
+        -30, 0, 15, 20, 20, 15, 0, -30,
+        -30, 5, 10, 15, 15, 10, 5, -30,
+        -40, -20, 0, 5, 5, 0, -20, -40,
+        -50, -40, -30, -30, -30, -30, -40, -50],
+    Material.Bisshop: [
+        -20, -10, -10, -10, -10, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 10, 10, 5, 0, -10,
+        -10, 5, 5, 10, 10, 5, 5, -10,
+        -10, 0, 10, 10, 10, 10, 0, -10,
+        -10, 10, 10, 10, 10, 10, 10, -10,
+        -10, 5, 0, 0, 0, 0, 5, -10,
+        -20, -10, -10, -10, -10, -10, -10, -20],
+    Material.Rook: [
+        0, 0, 0, 0, 0, 0, 0, 0,
+        5, 10, 10, 10, 10, 10, 10, 5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        0, 0, 0, 5, 5, 0, 0, 0],
+    Material.Queen: [
+        -20, -10, -10, -5, -5, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 5, 5, 5, 0, -10,
+        -5, 0, 5, 5, 5, 5, 0, -5,
+        0, 0, 5, 5, 5, 5, 0, -5,
+        -10, 5, 5, 5, 5, 5, 0, -10,
+        -10, 0, 5, 0, 0, 0, 0, -10,
+        -20, -10, -10, -5, -5, -10, -10, -20],
+    Material.King: [
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -20, -30, -30, -40, -40, -30, -30, -20,
+        -10, -20, -20, -20, -20, -20, -20, -10,
+        20, 20, 0, 0, 0, 0, 20, 20,
+        20, 30, 10, 0, 0, 10, 30, 20],
+}
+
+# For every piece code plus 6, the score of that piece in pawns, and its
+# score in centipawns on every square including the piece-square bonus. White
+# scores are positive.
+CODE_WORTHS = [0] * 13
+SQUARE_SCORES = [[0] * 64 for _ in range(13)]
+for (side, sign) in [(Side.White, 1), (Side.Black, -1)]:
+    for material in MATERIALS:
+        piece = PIECES[side][material]
+        code = PIECE_CODES[side][material] + 6
+        CODE_WORTHS[code] = piece.score
+        for square in range(64):
+            mirrored = square if side == Side.White else square ^ 56
+            SQUARE_SCORES[code][square] = sign * (
+                100 * piece.worth + PIECE_SQUARE_TABLES[material][mirrored])
+
+# The same scores by side and material, as the boards use them to keep their
+# square_score up to date
+PIECE_SQUARE_SCORES = [
+    dict((material, SQUARE_SCORES[PIECE_CODES[side][material] + 6])
+         for material in MATERIALS) for side in [Side.White, Side.Black]]
+
+if numpy != None:
+    CODE_WORTHS_ARRAY = numpy.array(CODE_WORTHS, dtype=numpy.int32)
+    SQUARE_SCORES_ARRAY = numpy.array(SQUARE_SCORES, dtype=numpy.int32)
+
+
+# Returns the score in centipawns of the board given as array of piece codes
+def piece_square_score(codes):
+    score = 0
+    for square, code in enumerate(codes):
+        if code:
+            score += SQUARE_SCORES[code + 6][square]
+    return score
 
 
 # A chess configuration is specified by whose turn it is and a 2d array
@@ -78,10 +409,38 @@ class ChessBoard:
         # This variable is either equal to Side.White or Side.Black
         self.turn = turn
         self.board_matrix = None
+        # Every entry holds the move, the captured piece, the side that made
+        # the move and the hash before it, so push() can be reverted by pop()
+        self.undo_stack = []
+        # The Zobrist hash of the position, kept up to date by every change
+        self.hash = ZOBRIST_BLACK if turn == Side.Black else 0
+        # The material balance, see get_material_balance(), also kept up to
+        # date by every change
+        self.material = 0
+        # The score in centipawns with the piece-square bonuses, see
+        # piece_square_score(), also kept up to date by every change
+        self.square_score = 0
+        # The square of the king of each side, or None when it is dead.
+        # Note: assumes there is at most one king per side
+        self.king_squares = [None, None]
 
     # Getter and setter methods
     def set_board_matrix(self, board_matrix):
         self.board_matrix = board_matrix
+        self.hash = self.compute_hash()
+        self.material = self.get_material_balance()
+        self.square_score = piece_square_score(self.to_array())
+        self.king_squares = [None, None]
+        for y in range(8):
+            for x in range(8):
+                piece = board_matrix[y][x]
+                if piece != None and piece.material == Material.King:
+                    self.king_squares[piece.side] = to_square((x, y))
+
+    # Returns the square of the king of the given side, or None when the
+    # king is dead
+    def get_king_square(self, side):
+        return self.king_squares[side]
 
     # Note: assumes the position is valid
     def get_boardpiece(self, position):
@@ -91,49 +450,175 @@ class ChessBoard:
     # Note: assumes the position is valid
     def set_boardpiece(self, position, piece):
         (x,y) = position
+        square = to_square(position)
+        old_piece = self.board_matrix[y][x]
+        if old_piece != None:
+            self.hash ^= ZOBRIST_KEYS[old_piece.side][old_piece.material][square]
+            self.material -= old_piece.score
+            self.square_score -= \
+                PIECE_SQUARE_SCORES[old_piece.side][old_piece.material][square]
+            if old_piece.material == Material.King:
+                self.king_squares[old_piece.side] = None
+        if piece != None:
+            self.hash ^= ZOBRIST_KEYS[piece.side][piece.material][square]
+            self.material += piece.score
+            self.square_score += \
+                PIECE_SQUARE_SCORES[piece.side][piece.material][square]
+            if piece.material == Material.King:
+                self.king_squares[piece.side] = square
         self.board_matrix[y][x] = piece
     
-    # Read in the board_matrix using an input string
-    def load_from_input(self, input_str):
+    # Remove all pieces from the board
+    def clear(self):
         self.board_matrix = [[None for _ in range(8)] for _ in range(8)]
-        x = 0
-        y = 0
-        for char in input_str:
-            if y == 8:
-                if char == 'W':
-                    self.turn = Side.White
-                elif char == 'B':
-                    self.turn = Side.Black
-                return
-            if char == '\r':
-                continue
-            if char == '.':
-                x += 1
-                continue
-            if char == '\n':
-                x = 0
-                y += 1
-                continue 
-            
-            if char.isupper():
-                side = Side.White
-            else:
-                side = Side.Black
-            material = char.lower()
+        self.undo_stack = []
+        self.hash = ZOBRIST_BLACK if self.turn == Side.Black else 0
+        self.material = 0
+        self.square_score = 0
+        self.king_squares = [None, None]
+
+    # Returns a new board with the same position
+    def copy(self):
+        new_board = ChessBoard(self.turn)
+        new_board.board_matrix = [row[:] for row in self.board_matrix]
+        new_board.hash = self.hash
+        new_board.material = self.material
+        new_board.square_score = self.square_score
+        new_board.king_squares = self.king_squares[:]
+        return new_board
 
-            piece = Piece(side, material)
-            self.set_boardpiece((x,y),piece)
-            x += 1
+    # Calculates the Zobrist hash of the position from scratch
+    def compute_hash(self):
+        key = ZOBRIST_BLACK if self.turn == Side.Black else 0
+        for y in range(8):
+            for x in range(8):
+                piece = self.get_boardpiece((x, y))
+                if piece != None:
+                    key ^= ZOBRIST_KEYS[piece.side][piece.material][
+                        to_square((x, y))]
+        return key
+
+    # Read in the board_matrix using an input string: eight rows of eight
+    # characters, optionally followed by a row with W or B for the side to
+    # move
+    def load_from_input(self, input_str):
+        lines = input_str.split('\n')
+        if len(lines) > 8 and lines[8][:1] == 'W':
+            self.turn = Side.White
+        elif len(lines) > 8 and lines[8][:1] == 'B':
+            self.turn = Side.Black
+
+        self.clear()
+        for y, line in enumerate(lines[:8]):
+            line = line.rstrip('\r')
+            if len(line) > 8:
+                raise ValueError("Invalid board row: " + line)
+            for x, char in enumerate(line):
+                if char != '.':
+                    if not CHAR_CODES.get(char):
+                        raise ValueError("Invalid board row: " + line)
+                    self.set_boardpiece((x, y),
+                                        CODE_PIECES[CHAR_CODES[char] + 6])
+
+    # Load a position in Forsyth-Edwards Notation, e.g.
+    # "3K4/k2R4/8/8/8/8/8/8 w". Only the pieces and the side to move are
+    # used: this game has no castling, en passant or move counters. Without
+    # the side to move white is to move. Raises a ValueError unless there are
+    # 8 rows of exactly 8 squares and the side to move is w or b.
+    def load_from_fen(self, fen):
+        fields = fen.split()
+        rows = fields[0].split('/') if fields else []
+        if len(rows) != 8:
+            raise ValueError("Invalid FEN: " + fen)
+
+        codes = []
+        for row in rows:
+            row_codes = []
+            for char in row:
+                if '1' <= char <= '8':
+                    row_codes += [0] * int(char)
+                elif char in CHAR_CODES and char != '.':
+                    row_codes.append(CHAR_CODES[char])
+                else:
+                    raise ValueError("Invalid FEN: " + fen)
+            if len(row_codes) != 8:
+                raise ValueError("Invalid FEN: " + fen)
+            codes += row_codes
+
+        if len(fields) > 1 and fields[1] not in ('w', 'b'):
+            raise ValueError("Invalid FEN: " + fen)
+        self.turn = Side.White
+        if len(fields) > 1 and fields[1] == 'b':
+            self.turn = Side.Black
+        self.load_from_array(codes)
+
+    # Returns the position in Forsyth-Edwards Notation. There is no castling
+    # or en passant, and the move counters always start over.
+    def to_fen(self):
+        codes = self.to_array()
+        rows = []
+        for y in range(8):
+            row = ""
+            empty = 0
+            for code in codes[y * 8:y * 8 + 8]:
+                if not code:
+                    empty += 1
+                    continue
+                if empty:
+                    row += str(empty)
+                    empty = 0
+                row += CODE_CHARS[code + 6]
+            if empty:
+                row += str(empty)
+            rows.append(row)
+        turn_char = "w" if self.turn == Side.White else "b"
+        return "/".join(rows) + " " + turn_char + " - - 0 1"
+
+    # Load a position in the binary format, see POSITION_SIZE
+    def load_from_bytes(self, data):
+        data = bytearray(data)
+        if len(data) != POSITION_SIZE or data[32] > Side.Black:
+            raise ValueError("Invalid binary position")
+        codes = []
+        for byte in data[:32]:
+            if BYTE_CODES[byte] == None:
+                raise ValueError("Invalid binary position")
+            codes += BYTE_CODES[byte]
+        self.turn = data[32]
+        self.load_from_array(codes)
+
+    # Returns the position in the binary format, see POSITION_SIZE
+    def to_bytes(self):
+        nibbles = [code if code >= 0 else 8 - code for code in self.to_array()]
+        data = bytearray(POSITION_SIZE)
+        for index in range(32):
+            data[index] = nibbles[2 * index] << 4 | nibbles[2 * index + 1]
+        data[32] = self.turn
+        return bytes(data)
+
+    # Load the position from an array of 64 piece codes, see to_array(). The
+    # turn stays the same.
+    def load_from_array(self, codes):
+        self.clear()
+        for square, code in enumerate(codes):
+            if code:
+                piece = CODE_PIECES[code + 6]
+                self.board_matrix[square >> 3][square & 7] = piece
+                self.hash ^= ZOBRIST_KEYS[piece.side][piece.material][square]
+                self.material += piece.score
+                self.square_score += SQUARE_SCORES[code + 6][square]
+                if piece.material == Material.King:
+                    self.king_squares[piece.side] = square
 
     # Print the current board state
     def __str__(self):
         return_str = ""
 
         return_str += "   abcdefgh\n\n"
-        y = 8
-        for board_row in self.board_matrix:
-            return_str += str(y) + "  " 
-            for piece in board_row:
+        for y in range(8):
+            return_str += str(8 - y) + "  "
+            for x in range(8):
+                piece = self.get_boardpiece((x, y))
                 if piece == None:
                     return_str += "."
                 else:
@@ -142,54 +627,93 @@ class ChessBoard:
                         char = char.upper()
                     return_str += char
             return_str += '\n'
-            y -= 1
         
         turn_name = ("White" if self.turn == Side.White else "Black") 
         return_str += "It is " + turn_name + "'s turn\n"
 
         return return_str
 
-    # Given a move string in chess notation, return a new ChessBoard object
-    # with the new board situation
+    # Given a move integer, return a new ChessBoard object with the new board
+    # situation
     # Note: this method assumes the move suggested is a valid, legal move
-    def make_move(self, move_str):
-        
-        start_pos = to_coordinate(move_str[0:2])
-        end_pos = to_coordinate(move_str[2:4])
-
-        if self.turn == Side.White:
-            turn = Side.Black
-        else:
-            turn = Side.White
-            
-        # Duplicate the current board_matrix
-        new_matrix = [row[:] for row in self.board_matrix]
-        
-        # Create a new chessboard object
-        new_board = ChessBoard(turn)
-        new_board.set_board_matrix(new_matrix)
-
-        # Carry out the move in the new chessboard object
-        piece = new_board.get_boardpiece(start_pos)
-        new_board.set_boardpiece(end_pos, piece)
-        new_board.set_boardpiece(start_pos, None)
-
+    def make_move(self, move):
+        # Duplicate the current board and carry out the move on the copy
+        new_board = self.copy()
+        new_board.push(move)
         return new_board
 
+    # Carry out a move on this board itself and remember how to revert it.
+    # This is what the search uses, since it avoids copying the board for
+    # every move that is tried.
+    # Note: this method assumes the move suggested is a valid, legal move
+    def push(self, move):
+        start = move & 63
+        end = move >> 6 & 63
+        start_row = self.board_matrix[start >> 3]
+        end_row = self.board_matrix[end >> 3]
+
+        piece = start_row[start & 7]
+        captured = end_row[end & 7]
+        self.undo_stack.append((move, captured, self.turn, self.hash,
+                                self.square_score))
+        end_row[end & 7] = piece
+        start_row[start & 7] = None
+        self.turn = 1 - self.turn
+
+        keys = ZOBRIST_KEYS[piece.side][piece.material]
+        self.hash ^= keys[start] ^ keys[end] ^ ZOBRIST_BLACK
+        scores = PIECE_SQUARE_SCORES[piece.side][piece.material]
+        self.square_score += scores[end] - scores[start]
+        if captured != None:
+            self.hash ^= ZOBRIST_KEYS[captured.side][captured.material][end]
+            self.material -= captured.score
+            self.square_score -= \
+                PIECE_SQUARE_SCORES[captured.side][captured.material][end]
+            if captured.material == Material.King:
+                self.king_squares[captured.side] = None
+        if piece.material == Material.King:
+            self.king_squares[piece.side] = end
+
+    # Pass the turn to the other side without moving, which the search uses
+    # for null move pruning. It is not put on the undo stack, since the pop()
+    # of any move made before it restores the turn as well.
+    def push_null(self):
+        self.turn = 1 - self.turn
+        self.hash ^= ZOBRIST_BLACK
+
+    # Revert push_null()
+    def pop_null(self):
+        self.turn = 1 - self.turn
+        self.hash ^= ZOBRIST_BLACK
+
+    # Revert the last move done with push() and return that move
+    def pop(self):
+        (move, captured, turn, key, square_score) = self.undo_stack.pop()
+        start = move & 63
+        end = move >> 6 & 63
+        end_row = self.board_matrix[end >> 3]
+
+        piece = end_row[end & 7]
+        self.board_matrix[start >> 3][start & 7] = piece
+        end_row[end & 7] = captured
+        self.turn = turn
+        self.hash = key
+        self.square_score = square_score
+        if piece.material == Material.King:
+            self.king_squares[piece.side] = start
+        if captured != None:
+            self.material += captured.score
+            if captured.material == Material.King:
+                self.king_squares[captured.side] = end
+        return move
+
     def is_king_dead(self, side):
-        seen_king = False
-        for x in range(8):
-            for y in range(8):
-                piece = self.get_boardpiece((x, y))
-                if piece != None and piece.side == side and \
-                        piece.material == Material.King:
-                    seen_king = True
-        return not seen_king
+        return self.king_squares[side] == None
     
     # This function should return, given the current board configuation and
     # which players turn it is, all the moves possible for that player
-    # It should return these moves as a list of move strings, e.g.
-    # [c2c3, d4e5, f4f8]
+    # It should return these moves as a list of move integers, e.g.
+    # [c2c3, d4e5, f4f8] as integers, see encode_move()
     def legal_moves(self):
         moves_list = []
         piece_locs = self.get_own_pieces()
@@ -209,115 +733,127 @@ class ChessBoard:
                 moves_list.extend(self.moves_queen(loc))
         return moves_list
 
-    # returns a list of all move strings for a king at location loc
-    # i.e [h5h6, h5g6, h5g5, h5g4, h5h4] (king is o the side of the board)
-    def moves_king(self, loc):
+    # Returns the moves of legal_moves() that take an enemy piece, in the same
+    # order. Sliders only need to look for the first piece on every ray.
+    def capture_moves(self):
+        captures = []
+        for loc in self.get_own_pieces():
+            square = to_square(loc)
+            material = self.board_matrix[loc[1]][loc[0]].material
+            if material == Material.Pawn:
+                rays = PAWN_RAYS[self.turn][square]
+            else:
+                rays = PIECE_RAYS[material][square]
+            for ray in rays:
+                for (y, x, move) in ray:
+                    piece = self.board_matrix[y][x]
+                    if piece != None:
+                        if piece.side != self.turn:
+                            captures.append(move | CAPTURE)
+                        break
+        return captures
+
+    # Returns the other moves of legal_moves(), in the same order: the moves
+    # to empty squares, and those of pawns onto friendly units
+    def quiet_moves(self):
         moves = []
-        x_dimension = [-1, 0, 1]
-        y_dimension = [-1, 0, 1]
-        for dx in x_dimension:
-            for dy in y_dimension:
-                moves.extend(self.explore_line(loc, dx, dy, one=True))
-        for move in range(len(moves)-1):
-            if move == to_move(loc,loc):
-                del moves[moves.index(move)]
+        for loc in self.get_own_pieces():
+            square = to_square(loc)
+            material = self.board_matrix[loc[1]][loc[0]].material
+            if material == Material.Pawn:
+                for (y, x, move) in PAWN_TARGETS[self.turn][square]:
+                    piece = self.board_matrix[y][x]
+                    if piece == None:
+                        if x == loc[0]:
+                            moves.append(move)
+                    elif piece.side == self.turn:
+                        moves.append(move)
+                continue
+            for ray in PIECE_RAYS[material][square]:
+                for (y, x, move) in ray:
+                    if self.board_matrix[y][x] != None:
+                        break
+                    moves.append(move)
         return moves
 
-    # returns a list of all move strings for a pawn at location loc
+    # returns a list of all moves for a king at location loc
+    # i.e [h5h6, h5g6, h5g5, h5g4, h5h4] (king is o the side of the board)
+    def moves_king(self, loc):
+        return self.explore_targets(KING_TARGETS[to_square(loc)])
+
+    # returns a list of all moves for a pawn at location loc
     # i.e. [a1a2, b1b2, c3b4]
     # this should be dependand whose turn it is.
     def moves_pawn(self, loc):
-        dy = 0
-        if self.turn == Side.White:
-            dy = -1
-        else:
-            dy = 1
-
-        if loc[1] + dy > 7 or loc[1] + dy < 0:
+        targets = PAWN_TARGETS[self.turn][to_square(loc)]
+        if not targets:
             return []
 
-        moves = [to_move(loc, (loc[0], loc[1] + dy))]
-        x_dimension = [-1, 1]
-        for dx in x_dimension:
-            new_loc = (loc[0] + dx, loc[1] + dy)
-            if 0 <= new_loc[0] <= 7 and self.get_boardpiece(new_loc):
-                moves.append(to_move(loc, new_loc))
-
+        # The forward move is always possible and takes whatever piece stands
+        # there, the diagonal ones take any piece
+        moves = []
+        for (y, x, move) in targets:
+            piece = self.board_matrix[y][x]
+            if piece == None:
+                if x == loc[0]:
+                    moves.append(move)
+            elif piece.side != self.turn:
+                moves.append(move | CAPTURE)
+            else:
+                moves.append(move)
         return moves
 
-    # returns a list of all move strings for a rook at location loc
+    # returns a list of all moves for a rook at location loc
     # i.e. [a1a3, a2f2, ...]
     def moves_rook(self, loc):
         moves = []
-        x_dimension = [-1, 1]
-        for dx in x_dimension:
-            moves.extend(self.explore_line(loc, dx, 0))
-        y_dimension = [-1, 1]
-        for dy in y_dimension:
-            moves.extend(self.explore_line(loc, 0, dy))
+        for ray in ROOK_RAYS[to_square(loc)]:
+            moves.extend(self.explore_ray(ray))
         return moves
 
-    # returns a list of all move strings for a queen at location loc
+    # returns a list of all moves for a queen at location loc
     def moves_queen(self, loc):
         moves = []
-        x_dimension = [-1,0,1]
-        y_dimension = [-1,0,1]
-        for dx in x_dimension:
-            for dy in y_dimension:
-                if dx == dy == 0:
-                    continue
-                moves.extend(self.explore_line(loc, dx, dy))
+        for ray in QUEEN_RAYS[to_square(loc)]:
+            moves.extend(self.explore_ray(ray))
         return moves
 
-    # returns a list of all move strings for a bisshop at location loc
+    # returns a list of all moves for a bisshop at location loc
     def moves_bisshop(self, loc):
         moves = []
-        x_dimension = [-1,1]
-        y_dimension = [-1,1]
-        for dx in x_dimension:
-            for dy in y_dimension:
-                moves.extend(self.explore_line(loc, dx, dy))
+        for ray in BISSHOP_RAYS[to_square(loc)]:
+            moves.extend(self.explore_ray(ray))
         return moves
 
-    # returns a list of all move strings for a knight at location loc
+    # returns a list of all moves for a knight at location loc
     def moves_knight(self, loc):
-        moves = []
-        x_dimension = [-2, -1, 1, 2]
-        y_dimension = [-2, -1, 1, 2]
-        for dx in x_dimension:
-            for dy in y_dimension:
-                if abs(dx) == abs(dy):
-                    continue
-                moves.extend(self.explore_line(loc, dx, dy, one=True))
-        return moves
+        return self.explore_targets(KNIGHT_TARGETS[to_square(loc)])
 
-    # returns all move strings from a location by incrementing with dx and dy
-    # untill the board edge, a friendly unit or an enemy unit is reached
-    # one=True will cause only one increment to happen and is thus useful for
-    # kings, knights (in the future) & pawns
-    def explore_line(self, loc, dx, dy, one=False):
+    # returns the moves along a ray of a slider, see ROOK_RAYS, untill the
+    # board edge, a friendly unit or an enemy unit is reached
+    def explore_ray(self, ray):
         moves = []
-        (newx, newy) = (loc[0] + dx, loc[1] + dy)
-        while -1 < newx < 8 and -1 < newy < 8 and not one:
-            piece = self.get_boardpiece((newx, newy))
+        for (y, x, move) in ray:
+            piece = self.board_matrix[y][x]
             if piece == None:
-                moves.append(to_move(loc, (newx, newy)))
+                moves.append(move)
             elif piece.side == self.turn:
                 break
-            elif piece.side != self.turn:
-                moves.append(to_move(loc, (newx, newy)))
+            else:
+                moves.append(move | CAPTURE)
                 break
-            newx += dx
-            newy += dy
+        return moves
 
-        if -1 < newx < 8 and -1 < newy < 8 and one:
-            piece = self.get_boardpiece((newx, newy))
+    # returns the moves to the targets of a king or knight, see KING_TARGETS,
+    # that are not occupied by a friendly unit
+    def explore_targets(self, targets):
+        moves = []
+        for (y, x, move) in targets:
+            piece = self.board_matrix[y][x]
             if piece == None:
-                moves.append(to_move(loc, (newx, newy)))
-            elif piece.side == self.turn:
-                pass
+                moves.append(move)
             elif piece.side != self.turn:
-                moves.append(to_move(loc, (newx, newy)))
+                moves.append(move | CAPTURE)
         return moves
 
     # returns a list of all pieces of current side.
@@ -325,39 +861,1055 @@ class ChessBoard:
         pos_w_piece = []
         for x in range(8):
             for y in range(8):
-                piece = self.get_boardpiece((x,y))
+                piece = self.board_matrix[y][x]
                 if piece and piece.side == self.turn:
                     pos_w_piece.append((x,y))
         return pos_w_piece
 
-    # This function should return, given the move specified (in the format
-    # 'd2d3') whether this move is legal
-    # of legal_moves()
+    # Returns the summed worth of the white pieces minus that of the black
+    # pieces
+    def get_material_balance(self):
+        score = 0
+        for board_row in self.board_matrix:
+            for piece in board_row:
+                if piece and not piece.side:
+                    score += piece.worth
+                if piece and piece.side:
+                    score -= piece.worth
+        return score
+
+    # Returns the board as an array of 64 signed bytes with the code of the
+    # piece on every square, see PIECE_CODES
+    def to_array(self):
+        codes = array.array('b', [0] * 64)
+        square = 0
+        for board_row in self.board_matrix:
+            for piece in board_row:
+                if piece != None:
+                    codes[square] = PIECE_CODES[piece.side][piece.material]
+                square += 1
+        return codes
+
+    # Returns whether the given side has other pieces than its king and pawns
+    def has_pieces(self, side):
+        for board_row in self.board_matrix:
+            for piece in board_row:
+                if piece and piece.side == side and \
+                        piece.material not in (Material.King, Material.Pawn):
+                    return True
+        return False
+
+    # This function should return, given the move specified (as an integer,
+    # flags are ignored) whether this move is legal. Only the piece on the
+    # start square is checked, so it gives the answer of legal_moves()
+    # without generating all moves.
     def is_legal_move(self, move):
-        if move in self.legal_moves():
-            return True
-        else:
+        start = move & 63
+        end = move >> 6 & 63
+        piece = self.board_matrix[start >> 3][start & 7]
+        if piece == None or piece.side != self.turn:
+            return False
+        target = self.board_matrix[end >> 3][end & 7]
+        (dx, dy) = ((end & 7) - (start & 7), (end >> 3) - (start >> 3))
+        material = piece.material
+
+        # The forward move of a pawn may even take a friendly unit, its
+        # diagonal moves need any unit on the target
+        if material == Material.Pawn:
+            if dy != (-1 if self.turn == Side.White else 1):
+                return False
+            return dx == 0 or abs(dx) == 1 and target != None
+        if target != None and target.side == self.turn:
+            return False
+        if material == Material.King:
+            return max(abs(dx), abs(dy)) == 1
+        if material == Material.Knight:
+            return sorted([abs(dx), abs(dy)]) == [1, 2]
+
+        between = BETWEEN_SQUARES[start].get(end)
+        if between == None:
+            return False
+        straight = dx == 0 or dy == 0
+        if material == Material.Rook and not straight or \
+                material == Material.Bisshop and straight:
+            return False
+        for square in between:
+            if self.board_matrix[square >> 3][square & 7] != None:
+                return False
+        return True
+
+
+# Bitboard backend
+
+# A bitboard is an integer in which bit n is set when square n is occupied.
+# The bitboards of one side are stored in the order of MATERIALS.
+KING_INDEX = MATERIALS.index(Material.King)
+PAWN_INDEX = MATERIALS.index(Material.Pawn)
+WORTHS = [MATERIAL_WORTHS[material] for material in MATERIALS]
+# The worths as they count in the score, for every side
+SIDE_WORTHS = [[PIECES[side][material].score for material in MATERIALS]
+               for side in [Side.White, Side.Black]]
+# The piece-square scores of every side, in the order of MATERIALS
+SIDE_SQUARE_SCORES = [[PIECE_SQUARE_SCORES[side][material]
+                       for material in MATERIALS]
+                      for side in [Side.White, Side.Black]]
+
+
+# Returns the bitboard of the squares returned by step_targets()
+def step_mask(square, steps, slide=False):
+    mask = 0
+    for target in step_targets(square, steps, slide):
+        mask |= 1 << target
+    return mask
+
+
+KING_ATTACKS = [step_mask(square, KING_DIRECTIONS) for square in range(64)]
+KNIGHT_ATTACKS = [step_mask(square, KNIGHT_JUMPS) for square in range(64)]
+
+# For every direction the squares along the ray from each square, and whether
+# the square numbers on that ray are increasing
+RAY_MASKS = {}
+RAY_INCREASING = {}
+for direction in ROOK_DIRECTIONS + BISSHOP_DIRECTIONS:
+    RAY_MASKS[direction] = [step_mask(square, [direction], slide=True)
+                            for square in range(64)]
+    RAY_INCREASING[direction] = direction[1] * 8 + direction[0] > 0
+
+# Pawns move one row forward, even onto occupied squares, and diagonally
+# forward onto any occupied square. A pawn on the last row can not move.
+PAWN_PUSHES = [[0] * 64, [0] * 64]
+PAWN_ATTACKS = [[0] * 64, [0] * 64]
+for square in range(64):
+    for (side, dy) in [(Side.White, -1), (Side.Black, 1)]:
+        PAWN_PUSHES[side][square] = step_mask(square, [(0, dy)])
+        PAWN_ATTACKS[side][square] = step_mask(square, [(-1, dy), (1, dy)])
+
+
+# Returns the number of set bits in a bitboard
+def count_bits(bitboard):
+    return bin(bitboard).count('1')
+
+
+# Returns the list of squares that are set in a bitboard, lowest first
+def bit_squares(bitboard):
+    squares = []
+    while bitboard:
+        lowest = bitboard & -bitboard
+        squares.append(lowest.bit_length() - 1)
+        bitboard ^= lowest
+    return squares
+
+
+# A chess configuration stored as 64-bit integers, one for every combination
+# of side and material. It offers the same interface as ChessBoard.
+class BitboardChessBoard(ChessBoard):
+
+    def __init__(self, turn):
+        ChessBoard.__init__(self, turn)
+        self.clear()
+
+    def clear(self):
+        self.bitboards = [[0] * len(MATERIALS), [0] * len(MATERIALS)]
+        self.occupied = [0, 0]
+        self.undo_stack = []
+        self.hash = ZOBRIST_BLACK if self.turn == Side.Black else 0
+        self.material = 0
+        self.square_score = 0
+
+    # Returns a new board with the same position
+    def copy(self):
+        new_board = BitboardChessBoard(self.turn)
+        new_board.bitboards = [self.bitboards[0][:], self.bitboards[1][:]]
+        new_board.occupied = self.occupied[:]
+        new_board.hash = self.hash
+        new_board.material = self.material
+        new_board.square_score = self.square_score
+        return new_board
+
+    # Note: assumes the position is valid
+    def get_boardpiece(self, position):
+        bit = 1 << to_square(position)
+        for side in [Side.White, Side.Black]:
+            if self.occupied[side] & bit:
+                for index, bitboard in enumerate(self.bitboards[side]):
+                    if bitboard & bit:
+                        return PIECES[side][MATERIALS[index]]
+        return None
+
+    # Note: assumes the position is valid
+    def set_boardpiece(self, position, piece):
+        square = to_square(position)
+        old_piece = self.get_boardpiece(position)
+        # Xoring removes the old piece and adds the new one
+        for changed_piece in [old_piece, piece]:
+            if changed_piece != None:
+                index = MATERIALS.index(changed_piece.material)
+                self.bitboards[changed_piece.side][index] ^= 1 << square
+                self.occupied[changed_piece.side] ^= 1 << square
+                self.hash ^= ZOBRIST_KEYS[changed_piece.side][
+                    changed_piece.material][square]
+        if old_piece != None:
+            self.material -= old_piece.score
+            self.square_score -= \
+                PIECE_SQUARE_SCORES[old_piece.side][old_piece.material][square]
+        if piece != None:
+            self.material += piece.score
+            self.square_score += \
+                PIECE_SQUARE_SCORES[piece.side][piece.material][square]
+
+    # Carry out a move on this board itself, see ChessBoard.push()
+    def push(self, move):
+        start = move & 63
+        end = move >> 6 & 63
+        start_bit = 1 << start
+        end_bit = 1 << end
+        key = self.hash
+        square_score = self.square_score
+
+        bitboards = self.bitboards[self.turn]
+        index = 0
+        while not bitboards[index] & start_bit:
+            index += 1
+
+        # The captured piece is stored as a (side, material index) pair
+        captured = None
+        for side in [Side.White, Side.Black]:
+            if self.occupied[side] & end_bit:
+                captured_boards = self.bitboards[side]
+                captured_index = 0
+                while not captured_boards[captured_index] & end_bit:
+                    captured_index += 1
+                captured_boards[captured_index] ^= end_bit
+                self.occupied[side] ^= end_bit
+                captured = (side, captured_index)
+                self.hash ^= ZOBRIST_KEYS[side][MATERIALS[captured_index]][end]
+                self.material -= SIDE_WORTHS[side][captured_index]
+                self.square_score -= \
+                    SIDE_SQUARE_SCORES[side][captured_index][end]
+
+        self.undo_stack.append((move, captured, self.turn, key,
+                                square_score))
+        bitboards[index] ^= start_bit | end_bit
+        self.occupied[self.turn] ^= start_bit | end_bit
+        keys = ZOBRIST_KEYS[self.turn][MATERIALS[index]]
+        self.hash ^= keys[start] ^ keys[end] ^ ZOBRIST_BLACK
+        scores = SIDE_SQUARE_SCORES[self.turn][index]
+        self.square_score += scores[end] - scores[start]
+        self.turn = 1 - self.turn
+
+    # Revert the last move done with push() and return that move
+    def pop(self):
+        (move, captured, turn, key, square_score) = self.undo_stack.pop()
+        start_bit = 1 << (move & 63)
+        end_bit = 1 << (move >> 6 & 63)
+
+        bitboards = self.bitboards[turn]
+        index = 0
+        while not bitboards[index] & end_bit:
+            index += 1
+        bitboards[index] ^= start_bit | end_bit
+        self.occupied[turn] ^= start_bit | end_bit
+
+        if captured != None:
+            (side, captured_index) = captured
+            self.bitboards[side][captured_index] |= end_bit
+            self.occupied[side] |= end_bit
+            self.material += SIDE_WORTHS[side][captured_index]
+        self.turn = turn
+        self.hash = key
+        self.square_score = square_score
+        return move
+
+    def is_king_dead(self, side):
+        return not self.bitboards[side][KING_INDEX]
+
+    def get_king_square(self, side):
+        if not self.bitboards[side][KING_INDEX]:
+            return None
+        return self.bitboards[side][KING_INDEX].bit_length() - 1
+
+    # Returns a list of move integers for every move of the current side
+    def legal_moves(self):
+        return self.generate_moves(True, True)
+
+    def capture_moves(self):
+        return self.generate_moves(False, True)
+
+    def quiet_moves(self):
+        return self.generate_moves(True, False)
+
+    # Returns a list of the quiet moves, the captures or both. For every piece
+    # its quiet moves come before its captures.
+    def generate_moves(self, quiet, captures):
+        moves_list = []
+        own = self.occupied[self.turn]
+        enemy = self.occupied[1 - self.turn]
+        everything = own | enemy
+        for index, material in enumerate(MATERIALS):
+            for square in bit_squares(self.bitboards[self.turn][index]):
+                if material == Material.Pawn:
+                    targets = PAWN_PUSHES[self.turn][square] | \
+                        PAWN_ATTACKS[self.turn][square] & everything
+                elif material == Material.Knight:
+                    targets = KNIGHT_ATTACKS[square] & ~own
+                elif material == Material.King:
+                    targets = KING_ATTACKS[square] & ~own
+                else:
+                    targets = 0
+                    if material != Material.Bisshop:
+                        for direction in ROOK_DIRECTIONS:
+                            targets |= self.ray_attacks(square, direction,
+                                                        everything)
+                    if material != Material.Rook:
+                        for direction in BISSHOP_DIRECTIONS:
+                            targets |= self.ray_attacks(square, direction,
+                                                        everything)
+                    targets &= ~own
+                if quiet:
+                    for target in bit_squares(targets & ~enemy):
+                        moves_list.append(square | target << 6)
+                if captures:
+                    for target in bit_squares(targets & enemy):
+                        moves_list.append(square | target << 6 | CAPTURE)
+        return moves_list
+
+    # See ChessBoard.is_legal_move(). Only the targets of the piece on the
+    # start square are computed.
+    def is_legal_move(self, move):
+        start = move & 63
+        start_bit = 1 << start
+        end_bit = 1 << (move >> 6 & 63)
+        own = self.occupied[self.turn]
+        if not own & start_bit:
             return False
+        everything = own | self.occupied[1 - self.turn]
+        bitboards = self.bitboards[self.turn]
+        index = 0
+        while not bitboards[index] & start_bit:
+            index += 1
+        material = MATERIALS[index]
+
+        if material == Material.Pawn:
+            targets = PAWN_PUSHES[self.turn][start] | \
+                PAWN_ATTACKS[self.turn][start] & everything
+            return bool(targets & end_bit)
+        if own & end_bit:
+            return False
+        if material == Material.Knight:
+            return bool(KNIGHT_ATTACKS[start] & end_bit)
+        if material == Material.King:
+            return bool(KING_ATTACKS[start] & end_bit)
+
+        directions = []
+        if material != Material.Bisshop:
+            directions += ROOK_DIRECTIONS
+        if material != Material.Rook:
+            directions += BISSHOP_DIRECTIONS
+        for direction in directions:
+            if RAY_MASKS[direction][start] & end_bit:
+                return bool(self.ray_attacks(start, direction, everything) &
+                            end_bit)
+        return False
+
+    # Returns the bitboard of the squares a slider on square reaches in the
+    # given direction, up to and including the first occupied square
+    @staticmethod
+    def ray_attacks(square, direction, everything):
+        ray = RAY_MASKS[direction][square]
+        blockers = ray & everything
+        if not blockers:
+            return ray
+        if RAY_INCREASING[direction]:
+            blocker = (blockers & -blockers).bit_length() - 1
+        else:
+            blocker = blockers.bit_length() - 1
+        return ray ^ RAY_MASKS[direction][blocker]
+
+    # returns a list of all pieces of current side.
+    def get_own_pieces(self):
+        return [to_position(square)
+                for square in bit_squares(self.occupied[self.turn])]
+
+    def get_material_balance(self):
+        score = 0
+        for index, worth in enumerate(WORTHS):
+            score += worth * count_bits(self.bitboards[Side.White][index])
+            score -= worth * count_bits(self.bitboards[Side.Black][index])
+        return score
+
+    def load_from_array(self, codes):
+        self.clear()
+        for square, code in enumerate(codes):
+            if code:
+                side = Side.White if code > 0 else Side.Black
+                index = abs(code) - 1
+                bit = 1 << square
+                self.bitboards[side][index] |= bit
+                self.occupied[side] |= bit
+                self.material += SIDE_WORTHS[side][index]
+                self.square_score += SIDE_SQUARE_SCORES[side][index][square]
+                self.hash ^= ZOBRIST_KEYS[side][MATERIALS[index]][square]
+
+    def to_array(self):
+        codes = array.array('b', [0] * 64)
+        for side in [Side.White, Side.Black]:
+            for index, bitboard in enumerate(self.bitboards[side]):
+                code = PIECE_CODES[side][MATERIALS[index]]
+                for square in bit_squares(bitboard):
+                    codes[square] = code
+        return codes
+
+    def has_pieces(self, side):
+        for index, bitboard in enumerate(self.bitboards[side]):
+            if bitboard and index != KING_INDEX and index != PAWN_INDEX:
+                return True
+        return False
+
+
+# Transposition table
+
+# The kind of score stored in the transposition table: the exact score, or a
+# lower or upper bound on it when the search was cut off by alpha or beta
+class Bound:
+    Exact, Lower, Upper = range(0, 3)
+
+
+# Remembers the results of earlier searches by Zobrist hash, so a position
+# that is reached again is not searched again. Every entry is a tuple of
+# (hash, depth, score, bound, best move, generation).
+# The table has a fixed number of slots that fits in the given number of
+# megabytes. A new entry replaces the old one in its slot, of the same
+# position or another one, only if the old one is from an earlier search (an
+# older generation) or was searched less deep, so a shallow search of a
+# transposition does not overwrite a deeper result of the same search.
+class TranspositionTable:
+    # The approximate number of bytes one entry takes in memory
+    ENTRY_SIZE = 160
+
+    def __init__(self, megabytes=16):
+        self.resize(megabytes)
+
+    # Set the memory budget, this empties the table
+    def resize(self, megabytes):
+        self.size = 1
+        while self.size * 2 * self.ENTRY_SIZE <= megabytes * 1024 * 1024:
+            self.size *= 2
+        self.clear()
+
+    def clear(self):
+        self.entries = [None] * self.size
+        self.generation = 0
+
+    # Called at the start of every search, so entries of earlier searches
+    # are replaced first
+    def new_search(self):
+        self.generation += 1
+
+    # Returns the entry of the position with the given hash, or None
+    def probe(self, key):
+        entry = self.entries[key & (self.size - 1)]
+        if entry != None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, score, bound, move):
+        index = key & (self.size - 1)
+        old_entry = self.entries[index]
+        if old_entry == None or old_entry[5] != self.generation or \
+                old_entry[1] <= depth:
+            self.entries[index] = (key, depth, score, bound, move,
+                                   self.generation)
+
+
+# Raised inside the search when its time is up
+class SearchTimeout(Exception):
+    pass
+
+
+# Parallel search
+
+# The best score at the root found by any worker of a parallel search, see
+# ChessComputer.parallel_search()
+shared_bound = None
+
+
+# Runs in every worker process when the pool is created
+def init_search_worker(bound):
+    global shared_bound
+    shared_bound = bound
+
+
+# Searches one move at the root in a worker process, with the shared bound as
+# alpha for white or as beta for black. Returns a tuple of the move, its score,
+# the alpha and beta it was searched with and the number of nodes visited.
+# The score is None when the deadline passed before the search finished.
+def search_root_move(task):
+    (chessboard, move, depth, deadline) = task
+    inf = 99999999
+    white = chessboard.turn == Side.White
+    with shared_bound.get_lock():
+        bound = shared_bound.value
+    (alpha, beta) = (bound, inf) if white else (-inf, bound)
+
+    ChessComputer.nodes = 0
+    ChessComputer.killers = [[None, None] for _ in range(depth + 1)]
+    ChessComputer.deadline = deadline
+    chessboard.push(move)
+    try:
+        score = ChessComputer.alphabeta_turn(chessboard, depth - 1, alpha,
+                                             beta)
+    except SearchTimeout:
+        return move, None, alpha, beta, ChessComputer.nodes
+    finally:
+        ChessComputer.deadline = None
+    chessboard.pop()
+
+    with shared_bound.get_lock():
+        if (white and score > shared_bound.value) or \
+                (not white and score < shared_bound.value):
+            shared_bound.value = score
+    return move, score, alpha, beta, ChessComputer.nodes
+
+
+# Search statistics
+
+# What one search did and where its time went, see
+# ChessComputer.computer_move(). While the search runs, the TIMED_METHODS of
+# the board and ChessComputer.evaluate_board are replaced by versions that
+# time every call, so without statistics the search pays nothing for them.
+# The time spent in the timing itself is counted as well.
+# With more than one worker the nodes include those of the workers, but the
+# cutoffs, leaf evaluations and timed calls only count the part of the search
+# in this process.
+class SearchStatistics:
+    # The methods of the board that generate, make and take back moves
+    TIMED_METHODS = ["legal_moves", "capture_moves", "quiet_moves", "push",
+                     "pop"]
+
+    def __init__(self):
+        self.seconds = 0
+        self.nodes = 0
+        # The nodes of every iteration of iterative deepening, 0 for the
+        # iterations an earlier result was used for
+        self.nodes_per_depth = []
+        self.leaf_evaluations = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        # The number of calls and the seconds spent in each timed function
+        self.calls = {}
+        self.times = {}
+
+    def start(self, chessboard):
+        ChessComputer.nodes = 0
+        ChessComputer.cutoffs = 0
+        ChessComputer.first_move_cutoffs = 0
+        ChessComputer.statistics = self
+        self.evaluate_board = ChessComputer.evaluate_board
+        ChessComputer.evaluate_board = staticmethod(
+            self.timed("evaluate_board", self.evaluate_board))
+        for name in SearchStatistics.TIMED_METHODS:
+            setattr(chessboard, name,
+                    self.timed(name, getattr(chessboard, name)))
+        self.start_time = time.time()
+
+    def stop(self, chessboard):
+        self.seconds = time.time() - self.start_time
+        for name in SearchStatistics.TIMED_METHODS:
+            delattr(chessboard, name)
+        ChessComputer.evaluate_board = staticmethod(self.evaluate_board)
+        ChessComputer.statistics = None
+        self.nodes = ChessComputer.nodes
+        self.cutoffs = ChessComputer.cutoffs
+        self.first_move_cutoffs = ChessComputer.first_move_cutoffs
+        self.leaf_evaluations = self.calls.get("evaluate_board", 0)
+
+    # Returns a function that calls function and adds the time it took to
+    # the times of name
+    def timed(self, name, function):
+        self.calls[name] = 0
+        self.times[name] = 0
+
+        def timed_function(*args):
+            start_time = time.time()
+            try:
+                return function(*args)
+            finally:
+                self.calls[name] += 1
+                self.times[name] += time.time() - start_time
+        return timed_function
+
+    # The fraction of the cutoffs caused by the first move searched
+    def first_move_cutoff_rate(self):
+        if not self.cutoffs:
+            return 0
+        return self.first_move_cutoffs / float(self.cutoffs)
+
+    # How many times more nodes the last iteration took than the one before
+    def effective_branching_factor(self):
+        if len(self.nodes_per_depth) < 2 or not self.nodes_per_depth[-2]:
+            return 0
+        return self.nodes_per_depth[-1] / float(self.nodes_per_depth[-2])
+
+    def __str__(self):
+        lines = ["%d nodes in %.2f seconds (%d nodes per second)" % (
+            self.nodes, self.seconds, self.nodes / max(self.seconds, 1e-6))]
+        for depth, nodes in enumerate(self.nodes_per_depth):
+            lines.append("  depth %d: %d nodes" % (depth + 1, nodes))
+        lines.append("effective branching factor: %.2f" %
+                     self.effective_branching_factor())
+        lines.append("leaf evaluations: %d" % self.leaf_evaluations)
+        lines.append("cutoffs: %d, by the first move: %.0f%%" % (
+            self.cutoffs, 100 * self.first_move_cutoff_rate()))
+        for name in sorted(self.times):
+            lines.append("%s: %d calls, %.2f seconds (%.0f%%)" % (
+                name, self.calls[name], self.times[name],
+                100 * self.times[name] / max(self.seconds, 1e-6)))
+        return "\n".join(lines)
+
+
+# Endgame tablebases
+# A tablebase holds for every position of a set of materials, such as a white
+# king and rook against a black king (KRK), the distance to mate under the
+# rules of this game: the number of plies until the side to move captures the
+# enemy king when it wins, as a positive number, or loses its own king when it
+# loses, as a negative number. Draws are 0. Every position takes one signed
+# byte at its tablebase_index(). The tables are built by chess_tablebase.py.
+
+# The score of a win in the tablebases, from which the plies to mate are
+# subtracted. It is above any score a search can reach.
+TABLEBASE_SCORE = 1000000
+# The order of the materials in the name of a tablebase, and of the pieces in
+# its index
+TABLEBASE_MATERIALS = [Material.King, Material.Queen, Material.Rook,
+                       Material.Bisshop, Material.Knight, Material.Pawn]
+
+
+# Returns the name of the tablebase of the position in codes, see
+# ChessBoard.to_array(), and the squares of its pieces in the order of the name
+def tablebase_squares(codes):
+    pieces = [[], []]
+    for square, code in enumerate(codes):
+        if code:
+            piece = CODE_PIECES[code + 6]
+            pieces[piece.side].append(
+                (TABLEBASE_MATERIALS.index(piece.material), square))
+    name = ""
+    squares = []
+    for side in [Side.White, Side.Black]:
+        pieces[side].sort()
+        name += "".join(TABLEBASE_MATERIALS[order].upper()
+                        for (order, _) in pieces[side])
+        squares += [square for (_, square) in pieces[side]]
+    return name, squares
+
+
+# Returns the index of the position with the given squares in its tablebase
+def tablebase_index(squares, turn):
+    index = 0
+    for square in squares:
+        index = index * 64 + square
+    return index * 2 + turn
+
+
+# Returns the codes of the same position with the colors swapped and the board
+# flipped, in which the other side has to move
+def mirror_codes(codes):
+    return [-codes[square ^ 56] for square in range(64)]
+
+
+# The tablebases in the .tbl files of a directory, memory-mapped. A position
+# of which the colors are swapped is looked up flipped, so KRK also serves a
+# black king and rook against a white king.
+class Tablebases:
+
+    def __init__(self, directory="tablebases"):
+        self.files = []
+        self.tables = {}
+        for filename in sorted(glob.glob(os.path.join(directory, "*.tbl"))):
+            name = os.path.basename(filename)[:-4]
+            f = open(filename, 'rb')
+            if os.fstat(f.fileno()).st_size != 2 * 64 ** len(name):
+                f.close()
+                raise ValueError(filename + " is not a tablebase")
+            self.files.append(f)
+            self.tables[name] = mmap.mmap(f.fileno(), 0,
+                                          access=mmap.ACCESS_READ)
+
+    def close(self):
+        for table in self.tables.values():
+            table.close()
+        for f in self.files:
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # Returns the distance to mate of the position on the board for the side
+    # to move, or None when there is no tablebase for it
+    def probe(self, chessboard):
+        return self.probe_codes(chessboard.to_array(), chessboard.turn)
+
+    def probe_codes(self, codes, turn):
+        (name, squares) = tablebase_squares(codes)
+        table = self.tables.get(name)
+        if table == None:
+            (name, squares) = tablebase_squares(mirror_codes(codes))
+            turn = 1 - turn
+            table = self.tables.get(name)
+            if table == None:
+                return None
+        return struct.unpack_from('b', table,
+                                  tablebase_index(squares, turn))[0]
 
 
 # This static class is responsible for providing functions that can calculate
 # the optimal move using minimax
 class ChessComputer:
 
+    # Shared by all searches, so results are also kept between moves
+    transposition_table = TranspositionTable()
+
+    # Counters of the current search: the number of positions visited, the
+    # number of beta cutoffs and how many of those the first move caused
+    nodes = 0
+    cutoffs = 0
+    first_move_cutoffs = 0
+
+    # Move ordering, see order_moves(). Switch it off to measure the number
+    # of nodes it saves.
+    move_ordering = True
+    # When True, alphabeta_turn generates its moves in stages, see
+    # staged_moves()
+    staged_generation = True
+    # When True, evaluate_board checks its result against evaluate_board_full
+    check_evaluation = False
+    # When True, alphabeta_turn continues with the captures at depth 0, see
+    # quiescence()
+    use_quiescence = True
+    # When True, all moves but the first are searched with a null window
+    # first, see search_move()
+    use_pvs = True
+    # When True, iterative deepening searches with a window of
+    # aspiration_window pawns around the score of the previous iteration
+    use_aspiration = True
+    aspiration_window = 2
+    # When True, alphabeta_turn first lets the side to move pass. If the
+    # opponent cannot make use of that in a search null_move_reduction plies
+    # less deep, the position is good enough to be cut off.
+    use_null_move = True
+    null_move_reduction = 2
+    # When True, alphabeta_turn searches the quiet moves after the first
+    # lmr_moves one ply less deep, see search_move()
+    use_lmr = True
+    lmr_moves = 3
+    # When True, scores are in centipawns and include the piece-square
+    # tables, see PIECE_SQUARE_TABLES
+    use_piece_squares = False
+    # When True and NumPy is available, the positions after all moves of a
+    # node at depth 1 are evaluated at once, see evaluate_children(). Only
+    # without quiescence search are those positions leaves.
+    batch_evaluation = False
+    # For every ply the two last quiet moves that caused a cutoff there
+    killers = []
+    # For every quiet move, the summed squared depths at which it caused a
+    # cutoff
+    history = {}
+    # The SearchStatistics of the current search, or None
+    statistics = None
+    # The time.time() at which the current search has to stop, or None
+    deadline = None
+    # The deepest depth iterative deepening goes to without a depth limit
+    max_depth = 100
+
     # This method uses either alphabeta or minimax to calculate the best move
     # possible. The input needed is a chessboard configuration and the max
     # depth of the search algorithm. It returns a tuple of (score, chessboard)
     # with score the maximum score attainable and chessboardmove that is needed
     # to achieve this score.
+    # With a time_limit in seconds alphabeta is always used, and the depth may
+    # be left out to search as deep as the time allows.
+    # With more than one worker alphabeta searches the moves at the root in
+    # that many processes, see parallel_search().
+    # The alphabeta search can also use a PositionCache from chess_cache.py,
+    # which keeps results between runs. A cached result is returned at once
+    # when it was searched at least depth deep. Otherwise, and always when no
+    # depth is given, the search goes on from the iteration after its depth,
+    # and its move is tried first.
+    # A position in the given Tablebases is not searched at all, see
+    # tablebase_move().
+    # With statistics a SearchStatistics of the search is returned as third
+    # element of the tuple.
     @staticmethod
-    def computer_move(chessboard, depth, alphabeta=False):
-        if alphabeta:
-            inf = 99999999
-            min_inf = -inf
-            return ChessComputer.alphabeta(chessboard, depth, min_inf, inf)
-        else:
+    def computer_move(chessboard, depth=None, alphabeta=False,
+                      time_limit=None, workers=1, cache=None,
+                      statistics=False, tablebases=None):
+        if statistics:
+            search_statistics = SearchStatistics()
+            search_statistics.start(chessboard)
+            try:
+                (score, move) = ChessComputer.computer_move(
+                    chessboard, depth, alphabeta, time_limit, workers, cache,
+                    tablebases=tablebases)
+            finally:
+                search_statistics.stop(chessboard)
+            return score, move, search_statistics
+
+        if not alphabeta and time_limit == None:
             return ChessComputer.minimax(chessboard, depth)
 
+        if tablebases != None:
+            result = ChessComputer.tablebase_move(chessboard, tablebases)
+            if result != None:
+                return result
+
+        cached = None
+        if cache != None:
+            entry = cache.lookup(chessboard.hash)
+            if entry != None and chessboard.is_legal_move(entry[0]):
+                (move, score, cached_depth) = entry
+                if depth != None and cached_depth >= depth:
+                    return score, move
+                cached = (score, move, cached_depth)
+                ChessComputer.transposition_table.store(
+                    chessboard.hash, cached_depth, score, Bound.Exact, move)
+
+        if depth == None:
+            depth = ChessComputer.max_depth
+        if alphabeta and workers > 1:
+            (score, move, searched_depth) = ChessComputer.parallel_search(
+                chessboard, depth, workers, time_limit, cached)
+        else:
+            (score, move, searched_depth) = ChessComputer.iterative_deepening(
+                chessboard, depth, time_limit, cached)
+
+        if cache != None and move != None:
+            cache.store(chessboard.hash, move, score, searched_depth)
+        return score, move
+
+    # Returns a tuple of the score and the best move according to the
+    # tablebases, or None when the position is not in them. A win scores
+    # TABLEBASE_SCORE minus the plies to mate, a loss the opposite, and the
+    # fastest win or slowest loss is played. Among drawing moves the one that
+    # leaves the most material is played.
+    @staticmethod
+    def tablebase_move(chessboard, tablebases):
+        if tablebases.probe(chessboard) == None:
+            return None
+        sign = 1 if chessboard.turn == Side.White else -1
+        best = None
+        for move in chessboard.legal_moves():
+            chessboard.push(move)
+            # The plies to mate for the side that made the move
+            if chessboard.is_king_dead(chessboard.turn):
+                distance = 1
+            elif chessboard.is_king_dead(1 - chessboard.turn):
+                distance = -1
+            else:
+                distance = tablebases.probe(chessboard)
+                if distance == None:
+                    chessboard.pop()
+                    return None
+                if distance < 0:
+                    distance = 1 - distance
+                elif distance > 0:
+                    distance = -1 - distance
+            material = chessboard.material * sign
+            chessboard.pop()
+
+            if distance > 0:
+                rank = (2, -distance)
+            elif distance < 0:
+                rank = (0, -distance)
+            else:
+                rank = (1, material)
+            if best == None or rank > best[0]:
+                best = (rank, distance, move)
+
+        if best == None:
+            return None
+        (_, distance, move) = best
+        if distance > 0:
+            score = TABLEBASE_SCORE - distance
+        elif distance < 0:
+            score = -TABLEBASE_SCORE - distance
+        else:
+            score = 0
+        return score * sign, move
+
+    # Searches with alphabeta to depth 1, 2, 3, ... until max_depth is done or
+    # time_limit seconds have passed. Every iteration fills the transposition
+    # table, so the next one tries the best moves found so far first.
+    # A result of an earlier search of the position, as a tuple of the score,
+    # the move and its depth, is taken as the result so far, and the search
+    # starts at the iteration after its depth.
+    # Returns a tuple of the score, the move and the depth of the deepest
+    # iteration that finished. Without an earlier result the first iteration
+    # always finishes.
+    @staticmethod
+    def iterative_deepening(chessboard, max_depth, time_limit=None,
+                            result=None):
+        inf = 99999999
+        min_inf = -inf
+        ChessComputer.transposition_table.new_search()
+        ChessComputer.nodes = 0
+        ChessComputer.cutoffs = 0
+        ChessComputer.first_move_cutoffs = 0
+        ChessComputer.killers = [[None, None] for _ in range(max_depth + 1)]
+        ChessComputer.history = {}
+        start_time = time.time()
+        undo_length = len(chessboard.undo_stack)
+
+        if result == None:
+            result = (0, None, 0)
+        elif time_limit != None:
+            ChessComputer.deadline = start_time + time_limit
+        if ChessComputer.statistics != None:
+            ChessComputer.statistics.nodes_per_depth += [0] * result[2]
+        try:
+            for depth in range(result[2] + 1, max_depth + 1):
+                # The score rarely changes much from one iteration to the
+                # next, so a narrow window around the last one prunes more.
+                # When the score falls outside it, it is only a bound and the
+                # iteration is repeated with the full window.
+                (alpha, beta) = (min_inf, inf)
+                if ChessComputer.use_aspiration and depth > 1:
+                    window = ChessComputer.aspiration_window
+                    if ChessComputer.use_piece_squares:
+                        window *= 100
+                    (alpha, beta) = (result[0] - window, result[0] + window)
+                (score, move) = ChessComputer.alphabeta(chessboard, depth,
+                                                        alpha, beta)
+                if not alpha < score < beta:
+                    (score, move) = ChessComputer.alphabeta(chessboard, depth,
+                                                            min_inf, inf)
+                result = (score, move, depth)
+                if ChessComputer.statistics != None:
+                    nodes_per_depth = ChessComputer.statistics.nodes_per_depth
+                    nodes_per_depth.append(ChessComputer.nodes -
+                                           sum(nodes_per_depth))
+                if move == None:
+                    break
+
+                # An iteration takes longer than all the ones before it, so
+                # do not start one that is unlikely to finish
+                if time_limit != None:
+                    ChessComputer.deadline = start_time + time_limit
+                    if time.time() - start_time > time_limit / 2.0:
+                        break
+        except SearchTimeout:
+            # Take back the moves of the unfinished iteration
+            while len(chessboard.undo_stack) > undo_length:
+                chessboard.pop()
+        finally:
+            ChessComputer.deadline = None
+        return result
+
+    # Searches the moves at the root in a pool of worker processes and returns
+    # the same score as alphabeta with the same depth. A search one ply less
+    # deep first orders the moves and fills the transposition table, which
+    # the workers inherit. The move that is most likely the best is then
+    # searched here with the full window. The other moves are divided over
+    # the workers, which share the best score found so far as alpha (or beta
+    # for black), so each worker prunes with the results of all others.
+    # With a time_limit in seconds the search one ply less deep only goes to
+    # depth 1, and the workers search depth 2, 3, ... like
+    # iterative_deepening() until depth is done or the time is up.
+    # An earlier result is used like iterative_deepening() does, and the
+    # workers start at the iteration after its depth.
+    # Returns a tuple of the score, the move and the depth of the deepest
+    # iteration that finished.
+    @staticmethod
+    def parallel_search(chessboard, depth, workers=None, time_limit=None,
+                        result=None):
+        start_time = time.time()
+        first_depth = depth if time_limit == None else min(depth, 2)
+        result = ChessComputer.iterative_deepening(
+            chessboard, max(first_depth - 1, 1), time_limit, result)
+        if result[1] == None or result[2] >= depth:
+            return result
+        first_depth = max(first_depth, result[2] + 1)
+        killers = ChessComputer.killers
+        killers += [[None, None] for _ in range(depth + 1 - len(killers))]
+
+        deadline = None
+        if time_limit != None:
+            deadline = start_time + time_limit
+        bound = multiprocessing.Value('l', 0)
+        pool = multiprocessing.Pool(workers, init_search_worker, (bound,))
+        try:
+            for iteration_depth in range(first_depth, depth + 1):
+                try:
+                    (score, move) = ChessComputer.parallel_iteration(
+                        chessboard, iteration_depth, result[1], pool, bound,
+                        deadline)
+                except SearchTimeout:
+                    break
+                result = (score, move, iteration_depth)
+                if ChessComputer.statistics != None:
+                    nodes_per_depth = ChessComputer.statistics.nodes_per_depth
+                    nodes_per_depth.append(ChessComputer.nodes -
+                                           sum(nodes_per_depth))
+                if time_limit != None and \
+                        time.time() - start_time > time_limit / 2.0:
+                    break
+        finally:
+            pool.close()
+            pool.join()
+        return result
+
+    # Searches the root to depth with the workers of pool, starting with
+    # hash_move, see parallel_search(). Raises SearchTimeout when the deadline
+    # passes before all moves were searched.
+    @staticmethod
+    def parallel_iteration(chessboard, depth, hash_move, pool, bound,
+                           deadline):
+        inf = 99999999
+        min_inf = -inf
+        white = chessboard.turn == Side.White
+        moves = ChessComputer.order_moves(chessboard, chessboard.legal_moves(),
+                                          0, hash_move)
+
+        undo_length = len(chessboard.undo_stack)
+        chessboard.push(moves[0])
+        ChessComputer.deadline = deadline
+        try:
+            best_score = ChessComputer.alphabeta_turn(chessboard, depth - 1,
+                                                      min_inf, inf)
+        finally:
+            ChessComputer.deadline = None
+            # Also takes back the moves of a search that timed out
+            while len(chessboard.undo_stack) > undo_length:
+                chessboard.pop()
+        best_move = moves[0]
+        best_index = 0
+
+        # A copy leaves out what the board should not take along to the
+        # workers, such as the timed methods of SearchStatistics
+        bound.value = best_score
+        root = chessboard.copy()
+        tasks = [(root, move, depth, deadline) for move in moves[1:]]
+        for result in pool.imap_unordered(search_root_move, tasks):
+            (move, score, alpha, beta, nodes) = result
+            ChessComputer.nodes += nodes
+            if score == None:
+                raise SearchTimeout()
+            # A score on the edge of its window is only a bound, and the move
+            # is no better than the best one
+            if not alpha < score < beta:
+                continue
+            index = moves.index(move)
+            if (white and score > best_score) or \
+                    (not white and score < best_score) or \
+                    (score == best_score and index < best_index):
+                (best_score, best_move, best_index) = (score, move, index)
+
+        ChessComputer.transposition_table.store(
+            chessboard.hash, depth, best_score, Bound.Exact, best_move)
+        return best_score, best_move
+
     # This function uses minimax to calculate the next move. Given the current
     # chessboard and max depth, this function should return a tuple of the
     # the score and the move that should be executed
@@ -365,7 +1917,8 @@ class ChessComputer:
     # of a specific board configuration after the max depth is reached
     @staticmethod
     def minimax(chessboard, depth):
-        best_move = ''
+        ChessComputer.nodes = 0
+        best_move = None
         best_score = 99999
         enemy = Side.White
         if chessboard.turn == Side.White:
@@ -373,9 +1926,10 @@ class ChessComputer:
             best_score = -best_score
 
         for move in chessboard.legal_moves():
-            new_chessboard = chessboard.make_move(move)
+            chessboard.push(move)
+            score = ChessComputer.minimax_turn(chessboard, depth - 1)
+            chessboard.pop()
 
-            score = ChessComputer.minimax_turn(new_chessboard, depth - 1)
             if enemy == Side.White and score < best_score:
                 best_score = score
                 best_move = move
@@ -387,6 +1941,7 @@ class ChessComputer:
 
     @staticmethod
     def minimax_turn(chessboard, depth):
+        ChessComputer.count_node()
         best_score = 99999
         enemy = Side.White
         if chessboard.turn == Side.White:
@@ -397,9 +1952,10 @@ class ChessComputer:
             return ChessComputer.evaluate_board(chessboard, depth)
 
         for move in chessboard.legal_moves():
-            new_chessboard = chessboard.make_move(move)
+            chessboard.push(move)
+            score = ChessComputer.minimax_turn(chessboard, depth - 1)
+            chessboard.pop()
 
-            score = ChessComputer.minimax_turn(new_chessboard, depth - 1)
             if enemy == Side.White and score < best_score:
                 best_score = score
             elif enemy == Side.Black and score > best_score:
@@ -415,18 +1971,35 @@ class ChessComputer:
     # of a specific board configuration after the max depth is reached
     @staticmethod
     def alphabeta(chessboard, depth, alpha, beta):
-        best_move = ''
+        (window_alpha, window_beta) = (alpha, beta)
+        best_move = None
         best_score = beta
         enemy = Side.White
         if chessboard.turn == Side.White:
             enemy = Side.Black
             best_score = alpha
 
-        for move in chessboard.legal_moves():
-            new_chessboard = chessboard.make_move(move)
+        # This exact position may have been searched already
+        table = ChessComputer.transposition_table
+        entry = table.probe(chessboard.hash)
+        hash_move = None
+        if entry != None:
+            (_, entry_depth, score, bound, hash_move, _) = entry
+            if entry_depth == depth and bound == Bound.Exact and \
+                    alpha < score < beta:
+                return score, hash_move
+
+        # Start with the best move of the previous iteration, so its score
+        # prunes the other moves
+        moves = ChessComputer.order_moves(chessboard, chessboard.legal_moves(),
+                                          0, hash_move)
+
+        for index, move in enumerate(moves):
+            chessboard.push(move)
+            score = ChessComputer.search_move(chessboard, depth - 1, alpha,
+                                              beta, 1, index == 0)
+            chessboard.pop()
 
-            score = ChessComputer.alphabeta_turn(new_chessboard, depth - 1,
-                                                 alpha, beta)
             if enemy == Side.White and score < best_score:
                 best_score = score
                 best_move = move
@@ -436,65 +2009,454 @@ class ChessComputer:
                 best_move = move
                 alpha = best_score
 
+            # The score is beyond a narrowed window, so the iteration is
+            # repeated anyway
+            if alpha >= beta:
+                break
+
+        # A score on the edge of a narrowed window is only a bound
+        if best_move != None:
+            bound = Bound.Exact
+            if best_score <= window_alpha:
+                bound = Bound.Upper
+            elif best_score >= window_beta:
+                bound = Bound.Lower
+            table.store(chessboard.hash, depth, best_score, bound, best_move)
         return best_score, best_move
 
+    # ply is the number of moves made since the root of the search. A null
+    # move is only tried when allow_null is True, so never twice in a row.
     @staticmethod
-    def alphabeta_turn(chessboard, depth, alpha, beta):
+    def alphabeta_turn(chessboard, depth, alpha, beta, ply=1, allow_null=True):
+        ChessComputer.count_node()
+
         best_score = beta
         enemy = Side.White
         if chessboard.turn == Side.White:
             enemy = Side.Black
             best_score = alpha
 
-        if depth == 0 or chessboard.is_king_dead(chessboard.turn):
+        if chessboard.is_king_dead(chessboard.turn):
+            return ChessComputer.evaluate_board(chessboard, depth)
+        if depth == 0:
+            if ChessComputer.use_quiescence:
+                return ChessComputer.quiescence(chessboard, alpha, beta)
             return ChessComputer.evaluate_board(chessboard, depth)
 
-        for move in chessboard.legal_moves():
-            new_chessboard = chessboard.make_move(move)
+        # Look up what an earlier search found out about this position.
+        # evaluate_board scales scores by the depth left, so only scores of
+        # an entry searched to this same depth can be used.
+        table = ChessComputer.transposition_table
+        entry = table.probe(chessboard.hash)
+        hash_move = None
+        if entry != None:
+            (_, entry_depth, score, bound, hash_move, _) = entry
+            if entry_depth == depth:
+                if bound != Bound.Upper and score >= beta:
+                    return beta
+                if bound != Bound.Lower and score <= alpha:
+                    return alpha
+                if bound == Bound.Exact:
+                    return score
+
+        # With only a king and pawns, passing may well be the best move
+        # (zugzwang), so the null move says nothing about the position
+        if ChessComputer.use_null_move and allow_null and depth >= 3 and \
+                chessboard.has_pieces(chessboard.turn):
+            null_depth = depth - 1 - ChessComputer.null_move_reduction
+            chessboard.push_null()
+            if enemy == Side.Black:
+                score = ChessComputer.alphabeta_turn(chessboard, null_depth,
+                                                     beta - 1, beta, ply + 1,
+                                                     False)
+            else:
+                score = ChessComputer.alphabeta_turn(chessboard, null_depth,
+                                                     alpha, alpha + 1, ply + 1,
+                                                     False)
+            chessboard.pop_null()
+            if enemy == Side.Black and score >= beta:
+                return beta
+            if enemy == Side.White and score <= alpha:
+                return alpha
+
+        if ChessComputer.staged_generation and ChessComputer.move_ordering:
+            moves = ChessComputer.staged_moves(chessboard, ply, hash_move)
+        else:
+            moves = ChessComputer.order_moves(
+                chessboard, chessboard.legal_moves(), ply, hash_move)
+
+        leaf_scores = None
+        if depth == 1 and ChessComputer.batch_evaluation and \
+                numpy != None and not ChessComputer.use_quiescence:
+            moves = list(moves)
+            leaf_scores = ChessComputer.evaluate_children(chessboard, moves)
+
+        killers = ChessComputer.killers[ply]
+        best_move = None
+        for index, move in enumerate(moves):
+            if leaf_scores != None:
+                ChessComputer.count_node()
+                score = leaf_scores[index]
+            else:
+                reduce = ChessComputer.use_lmr and depth >= 3 and \
+                    index >= ChessComputer.lmr_moves and \
+                    not move & CAPTURE and move != hash_move and \
+                    move not in killers
+                chessboard.push(move)
+                if reduce:
+                    reduce = not ChessComputer.threatens_king(chessboard, move)
+                score = ChessComputer.search_move(chessboard, depth - 1, alpha,
+                                                  beta, ply + 1, index == 0,
+                                                  reduce)
+                chessboard.pop()
 
-            score = ChessComputer.alphabeta_turn(new_chessboard, depth - 1,
-                                                 alpha, beta)
             if enemy == Side.White and score < best_score:
                 if score <= alpha:
+                    ChessComputer.register_cutoff(move, index == 0, depth,
+                                                  ply)
+                    table.store(chessboard.hash, depth, alpha, Bound.Upper,
+                                move)
                     return alpha
                 best_score = score
+                best_move = move
                 beta = best_score
             elif enemy == Side.Black and score > best_score:
                 if score >= beta:
+                    ChessComputer.register_cutoff(move, index == 0, depth,
+                                                  ply)
+                    table.store(chessboard.hash, depth, beta, Bound.Lower,
+                                move)
                     return beta
                 best_score = score
+                best_move = move
                 alpha = best_score
 
+        # Without a better move, white's score is at most the alpha it got,
+        # and black's score at least the beta it got
+        if best_move != None:
+            bound = Bound.Exact
+        elif enemy == Side.Black:
+            bound = Bound.Upper
+        else:
+            bound = Bound.Lower
+        table.store(chessboard.hash, depth, best_score, bound, best_move)
         return best_score
 
+    # Searches the position after a move with alphabeta_turn. With principal
+    # variation search only the first move, which is most likely the best,
+    # gets the full window. The other moves get a null window, which only
+    # tells whether the move is better than the best one so far, and are
+    # searched again with the full window when it is.
+    # With reduce, the move is a late quiet move that is unlikely to be the
+    # best, so it is first searched one ply less deep with a null window. Only
+    # when it turns out better than the best move so far, it is searched
+    # again to the full depth.
+    @staticmethod
+    def search_move(chessboard, depth, alpha, beta, ply, first, reduce=False):
+        # The move was made, so the side to move is the opponent
+        white = chessboard.turn == Side.Black
+        if reduce:
+            if white:
+                score = ChessComputer.alphabeta_turn(chessboard, depth - 1,
+                                                     alpha, alpha + 1, ply)
+                if score <= alpha:
+                    return score
+            else:
+                score = ChessComputer.alphabeta_turn(chessboard, depth - 1,
+                                                     beta - 1, beta, ply)
+                if score >= beta:
+                    return score
+
+        if first or not ChessComputer.use_pvs:
+            return ChessComputer.alphabeta_turn(chessboard, depth, alpha, beta,
+                                                ply)
+
+        if white:
+            score = ChessComputer.alphabeta_turn(chessboard, depth, alpha,
+                                                 alpha + 1, ply)
+        else:
+            score = ChessComputer.alphabeta_turn(chessboard, depth, beta - 1,
+                                                 beta, ply)
+        if alpha < score < beta:
+            score = ChessComputer.alphabeta_turn(chessboard, depth, alpha, beta,
+                                                 ply)
+        return score
+
+    # Returns the moves in the order the search should try them: the best move
+    # of an earlier search, then captures with the most valuable victim first
+    # and the least valuable attacker first among equal victims, then the
+    # killer moves of this ply and then the other moves ordered by their
+    # history score.
+    @staticmethod
+    def order_moves(chessboard, moves, ply, hash_move=None):
+        if not ChessComputer.move_ordering:
+            if hash_move in moves:
+                moves.remove(hash_move)
+                moves.insert(0, hash_move)
+            return moves
+
+        captures = []
+        quiet_moves = []
+        for move in moves:
+            if move == hash_move:
+                continue
+            if move & CAPTURE:
+                captures.append(move)
+            else:
+                quiet_moves.append(move)
+
+        ordered_moves = ChessComputer.order_captures(chessboard, captures)
+        if hash_move in moves:
+            ordered_moves.insert(0, hash_move)
+        for killer in ChessComputer.killers[ply]:
+            if killer in quiet_moves:
+                quiet_moves.remove(killer)
+                ordered_moves.append(killer)
+        history = ChessComputer.history
+        quiet_moves.sort(key=lambda move: -history.get(move, 0))
+        return ordered_moves + quiet_moves
+
+    # Yields the moves in the same order as order_moves(), but generates them
+    # in stages: the captures first, and the quiet moves only once all
+    # captures were tried. When one of the first moves causes a cutoff, the
+    # rest is never generated.
+    @staticmethod
+    def staged_moves(chessboard, ply, hash_move=None):
+        # The hash move is checked against the moves of its own stage, so a
+        # quiet hash move needs the quiet moves before the captures
+        quiet_moves = None
+        if hash_move != None and not hash_move & CAPTURE:
+            quiet_moves = chessboard.quiet_moves()
+            if hash_move in quiet_moves:
+                quiet_moves.remove(hash_move)
+                yield hash_move
+
+        captures = chessboard.capture_moves()
+        if hash_move in captures:
+            captures.remove(hash_move)
+            yield hash_move
+        for move in ChessComputer.order_captures(chessboard, captures):
+            yield move
+
+        if quiet_moves == None:
+            quiet_moves = chessboard.quiet_moves()
+        for killer in ChessComputer.killers[ply]:
+            if killer in quiet_moves:
+                quiet_moves.remove(killer)
+                yield killer
+        history = ChessComputer.history
+        quiet_moves.sort(key=lambda move: -history.get(move, 0))
+        for move in quiet_moves:
+            yield move
+
+    # Returns whether the piece that made move, the last move on the board,
+    # now attacks the king of the side to move. The king can be captured in
+    # this game, so such a move is as forcing as a check and is not reduced.
+    @staticmethod
+    def threatens_king(chessboard, move):
+        king_square = chessboard.get_king_square(chessboard.turn)
+        if king_square == None:
+            return False
+        chessboard.push_null()
+        threat = chessboard.is_legal_move((move >> 6 & 63) | king_square << 6)
+        chessboard.pop_null()
+        return threat
+
+    # Returns the captures sorted with the most valuable victim first, and the
+    # least valuable attacker first among equal victims
+    @staticmethod
+    def order_captures(chessboard, captures):
+        keyed_captures = []
+        for move in captures:
+            victim = chessboard.get_boardpiece(to_position(move >> 6 & 63))
+            attacker = chessboard.get_boardpiece(to_position(move & 63))
+            keyed_captures.append((-victim.worth, attacker.worth, move))
+        keyed_captures.sort(key=lambda capture: capture[0:2])
+        return [move for (_, _, move) in keyed_captures]
+
+    # Remember a move that caused a beta cutoff, so it is tried early in
+    # similar positions. first tells whether it was the first move searched.
+    @staticmethod
+    def register_cutoff(move, first, depth, ply):
+        ChessComputer.cutoffs += 1
+        if first:
+            ChessComputer.first_move_cutoffs += 1
+        if move & CAPTURE:
+            return
+
+        killers = ChessComputer.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        history = ChessComputer.history
+        history[move] = history.get(move, 0) + depth * depth
+
+    # Searches only captures from a position at the end of alphabeta_turn, so
+    # the score is not taken in the middle of an exchange. The side to move
+    # may also stand pat: keep the current score instead of capturing, which
+    # gives a lower bound for white and an upper bound for black.
+    @staticmethod
+    def quiescence(chessboard, alpha, beta):
+        ChessComputer.count_node()
+
+        white = chessboard.turn == Side.White
+        score = ChessComputer.evaluate_board(chessboard, 0)
+        if chessboard.is_king_dead(chessboard.turn):
+            return score
+        if white:
+            if score >= beta:
+                return beta
+            alpha = max(alpha, score)
+        else:
+            if score <= alpha:
+                return alpha
+            beta = min(beta, score)
+
+        captures = chessboard.capture_moves()
+        for move in ChessComputer.order_captures(chessboard, captures):
+            chessboard.push(move)
+            score = ChessComputer.quiescence(chessboard, alpha, beta)
+            chessboard.pop()
+
+            if white:
+                if score >= beta:
+                    return beta
+                alpha = max(alpha, score)
+            else:
+                if score <= alpha:
+                    return alpha
+                beta = min(beta, score)
+
+        return alpha if white else beta
+
+    # Counts a visited position and stops the search when its time is up.
+    # The clock is only read every 1024 nodes.
+    @staticmethod
+    def count_node():
+        ChessComputer.nodes += 1
+        if ChessComputer.deadline != None and not ChessComputer.nodes % 1024 \
+                and time.time() > ChessComputer.deadline:
+            raise SearchTimeout()
+
     # Calculates the score of a given board configuration based on the 
     # material left on the board. Returns a score number, in which positive
     # means white is better off, while negative means black is better of
+    # The board keeps its material balance up to date with every move, so
+    # this does not have to look at the pieces.
+    # With use_piece_squares the score is in centipawns and also counts where
+    # the pieces stand, which the board keeps up to date as well.
     @staticmethod
     def evaluate_board(chessboard, depth_left):
-        score = 0
-        for x in range(8):
-            for y in range(8):
-                piece = chessboard.get_boardpiece((x,y))
-                if piece and not piece.side:
-                    score += piece.worth
-                if piece and piece.side:
-                    score -= piece.worth
+        if ChessComputer.use_piece_squares:
+            score = chessboard.square_score
+            if ChessComputer.check_evaluation:
+                assert score == piece_square_score(chessboard.to_array()), \
+                    "The piece-square score of the board is out of date"
+        else:
+            score = chessboard.material
+            if ChessComputer.check_evaluation:
+                assert score == \
+                    ChessComputer.evaluate_board_full(chessboard, 0), \
+                    "The material balance of the board is out of date"
+
+        if depth_left:
+            score *= depth_left
+        return score
+
+    # Returns a list with the score of evaluate_board(board, 0) for the board
+    # after every move, computed with NumPy in one go. Every row of a matrix
+    # is the array of a board, see ChessBoard.to_array(), to which a move is
+    # applied by moving the code on its start square to its end square.
+    @staticmethod
+    def evaluate_children(chessboard, moves):
+        board = numpy.frombuffer(chessboard.to_array(), dtype=numpy.int8)
+        starts = numpy.array([move & 63 for move in moves], dtype=numpy.intp)
+        ends = numpy.array([move >> 6 & 63 for move in moves],
+                           dtype=numpy.intp)
+        rows = numpy.arange(len(moves))
+
+        children = numpy.repeat(board[numpy.newaxis, :], len(moves), axis=0)
+        children[rows, ends] = board[starts]
+        children[rows, starts] = 0
+        codes = children.astype(numpy.intp) + 6
+        if ChessComputer.use_piece_squares:
+            scores = SQUARE_SCORES_ARRAY[codes, numpy.arange(64)].sum(axis=1)
+        else:
+            scores = CODE_WORTHS_ARRAY[codes].sum(axis=1)
+        return scores.tolist()
+
+    # The same as evaluate_board, but counts all pieces on the board. It is
+    # slower, but does not depend on the board keeping track of its material.
+    @staticmethod
+    def evaluate_board_full(chessboard, depth_left):
+        score = chessboard.get_material_balance()
 
         if depth_left:
             score *= depth_left
         return score
 
 
+# Returns a new board with the position in the given .chb file. White is to
+# move when the file does not say. A .fen file holds a position in
+# Forsyth-Edwards Notation on its first line.
+def load_board(filename, board_class=ChessBoard):
+    chessboard = board_class(Side.White)
+    with open(filename) as f:
+        if filename.endswith(".fen"):
+            chessboard.load_from_fen(f.readline())
+        else:
+            chessboard.load_from_input(f.read())
+    return chessboard
+
+
+# Searches the position after the predicted move in a background thread while
+# the human is thinking about a move. If the human plays that move, the search
+# has had a head start, see ChessGame.make_computer_move().
+class Ponderer:
+
+    def __init__(self, chessboard, move):
+        self.chessboard = chessboard.make_move(move)
+        self.result = None
+        self.start_time = time.time()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        self.result = ChessComputer.iterative_deepening(
+            self.chessboard, ChessComputer.max_depth)
+
+    # Stops the search and returns a tuple of the (score, move, depth) of the
+    # deepest iteration that finished and the seconds the search ran
+    def stop(self):
+        # A deadline in the past ends the search at its next check
+        ChessComputer.deadline = 0
+        self.thread.join()
+        ChessComputer.deadline = None
+        return self.result, time.time() - self.start_time
+
+
 # This class is responsible for starting the chess game, playing and user 
 # feedback
 class ChessGame:
-    def __init__(self, turn):
+    # board_class is either ChessBoard or the faster BitboardChessBoard
+    def __init__(self, turn, board_class=ChessBoard):
      
-        # NOTE: you can make this depth higher once you have implemented
-        # alpha-beta, which is more efficient
-        self.depth = 6
-        self.chessboard = ChessBoard(turn)
+        # The computer searches deeper until time_limit seconds have passed,
+        # or until depth is reached when that is not None
+        self.time_limit = 5
+        self.depth = None
+        # Print what every search did, see SearchStatistics
+        self.statistics = False
+        # Search the position after the suggested move while the human is
+        # thinking, see Ponderer
+        self.ponder = True
+        self.ponderer = None
+        self.chessboard = board_class(turn)
+        # Results of earlier games, so known positions need no search
+        self.cache = PositionCache("positions.cache")
+        # Endgames that are played perfectly, see chess_tablebase.py
+        self.tablebases = Tablebases("tablebases")
 
         # If a file was specified as commandline argument, use that filename
         if len(sys.argv) > 1:
@@ -522,12 +2484,14 @@ class ChessGame:
             # Calculate the best possible move
             new_score, best_move = self.make_computer_move()
 
-            if best_move == '':  # Recognise a tie.
+            if best_move == None:  # Recognise a tie.
                 break
 
-            print("Best move: " + best_move)
+            print("Best move: " + move_to_notation(best_move))
             print("Score to achieve: " + str(new_score))
             print("")
+            if self.ponder:
+                self.ponderer = Ponderer(self.chessboard, best_move)
             self.make_human_move()
 
         print('No further moves possible.')
@@ -536,8 +2500,42 @@ class ChessGame:
 
     def make_computer_move(self):
         print("Calculating best move...")
-        return ChessComputer.computer_move(self.chessboard, self.depth,
-                                           alphabeta=True)
+        time_limit = self.time_limit
+        cache = self.cache
+        if self.ponderer != None:
+            (pondered, seconds) = self.ponderer.stop()
+            hit = self.ponderer.chessboard.hash == self.chessboard.hash
+            self.ponderer = None
+
+            # When the human played the predicted move, the search of this
+            # position already ran for seconds. If that is as long as this
+            # search may take, or it reached the depth, its move is played at
+            # once. Otherwise this search gets the time that is left, and
+            # starts with the transposition table the ponder search filled.
+            # Its result comes from a shortened budget, so it is not put in
+            # the cache. A position in the tablebases needs no search at all.
+            if hit and pondered != None and pondered[1] != None and \
+                    self.tablebases.probe(self.chessboard) == None:
+                (score, move, depth) = pondered
+                if (self.depth != None and depth >= self.depth) or \
+                        (self.depth == None and time_limit != None and
+                         seconds >= time_limit):
+                    print("Found while you were thinking")
+                    self.cache.store(self.chessboard.hash, move, score, depth)
+                    return score, move
+                if time_limit != None:
+                    time_limit -= seconds
+                    cache = None
+
+        result = ChessComputer.computer_move(self.chessboard, self.depth,
+                                             alphabeta=True,
+                                             time_limit=time_limit,
+                                             cache=cache,
+                                             statistics=self.statistics,
+                                             tablebases=self.tablebases)
+        if self.statistics:
+            print(result[2])
+        return result[0:2]
 
     def make_human_move(self):
         # Endlessly request input until the right input is specified
@@ -549,7 +2547,8 @@ class ChessGame:
             if move == "q":
                 print("Exiting program...")
                 sys.exit(0)
-            elif self.chessboard.is_legal_move(move):
+            move = notation_to_move(move)
+            if move != None and self.chessboard.is_legal_move(move):
                 break
             print("Incorrect move!")
 
@@ -566,5 +2565,6 @@ class ChessGame:
             sys.exit(0)
 
 
-chess_game = ChessGame(Side.White)
-chess_game.main()
+if __name__ == "__main__":
+    chess_game = ChessGame(Side.White)
+    chess_game.main()